@@ -0,0 +1,936 @@
+#!/usr/bin/env python3
+
+###########################################
+## BranchSim.py
+##
+## Purpose: Trace-driven branch predictor models for the BPRED_LOGGER logs
+##
+## A component of the CORE-V-WALLY configurable RISC-V project.
+## https://github.com/openhwgroup/cvw
+##
+## Copyright (C) 2021-23 Harvey Mudd College & Oklahoma State University
+##
+## SPDX-License-Identifier: Apache-2.0 WITH SHL-2.1
+##
+## Licensed under the Solderpad Hardware License v 2.1 (the “License”); you may not use this file
+## except in compliance with the License, or, at your option, the Apache License version 2.0. You
+## may obtain a copy of the License at
+##
+## https:##solderpad.org/licenses/SHL-2.1/
+##
+## Unless required by applicable law or agreed to in writing, any work distributed under the
+## License is distributed on an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+## either express or implied. See the License for the specific language governing permissions
+## and limitations under the License.
+################################################################################################
+
+# how to invoke this simulator:
+# BranchSim.py -f <branch.log> (-p <type>:<params> ...)
+# branch.log is written by the BPRED_LOGGER in loggers.sv, one '%h t/n' line per
+# conditional branch, with TRAIN at reset and BEGIN/END <memfile> around the measured
+# part of each benchmark.  Every benchmark starts with empty predictor tables at TRAIN;
+# the branches before BEGIN train the tables but only those up to END are counted,
+# like the performance counters.  Add --countwarmup to also count the training branches.
+# Logs already split per benchmark (no END line) are treated as one benchmark.
+# -b simulates only the named benchmarks and -j spreads the benchmarks over worker
+# processes; both seek to the benchmarks through the index SeparateBranch.py keeps
+# next to the log, building it on first use.
+#
+# Predictors are named as in the parseHPMC.py list files:
+#   twobit:k       2^k two-bit counters indexed by the PC (bimodal is an alias)
+#   gshare:k       2^k counters indexed by the PC xor k bits of global history
+#   global:k       2^k counters indexed by k bits of global history
+#   local:m:k      2^m k-bit local histories indexed by the PC, selecting one of
+#                  2^k counters (yehpatt is an alias)
+# The indexes follow Wally: the PC index is {PC[k+1]^PC[1], PC[k:2]} and histories
+# shift right with the newest outcome in the msb.  Counters start weakly taken.
+# Candidates that Wally does not implement can be ranked before writing any RTL:
+#   tage:k:n[:shortest:longest[:tagbits]]
+#                  TAGE with a 2^k entry bimodal base and n tagged tables of 2^k
+#                  entries whose history lengths grow geometrically from shortest
+#                  to longest (default 4 to 64) with tagbits bit tags (default 8)
+#   perceptron:k:h[:n]
+#                  hashed perceptron with a bias table and n (default 8) tables of
+#                  2^k 8-bit weights, each hashed with a slice of h history bits
+#   loop:m:k       2^m entry loop predictor overriding a gshare:k
+# The bits row of the table is the storage of each predictor, counted as
+# ComputePredSize in parseHPMC.py does: 2 bits per two-bit counter plus the
+# history, tag, useful, weight and loop count bits of the other predictors.
+# The BDMR (branch direction misprediction rate, %) of each benchmark is reported
+# with the geometric mean over the benchmarks, computed as parseHPMC.py does.
+# The log is streamed one benchmark at a time and every listed predictor is
+# simulated in the same pass over it.
+#
+# Given a cfi.log, which has a line for every control flow instruction with its
+# target, {call, return, jump, branch} class, length and the number of other
+# instructions retired before it, the branches drive the direction predictors and
+# these predictors can also be simulated:
+#   btb:k[:ways[:policy]]   2^k entry BTB, reporting the BTMR.  With one way (the
+#                  default) it is Wally's untagged direct-mapped BTB; more ways
+#                  are tagged and replaced with a CacheSim.py policy (default lru)
+#   class:k[:ways[:policy]] the same BTB predicting the instruction class as with
+#                  INSTR_CLASS_PRED=1, reporting the ClassMPR
+#   ras:n          n entry return address stack, reporting the RASMPR
+# The rates are counted as ComputeStats in parseHPMC.py does and match the
+# bpred-sim.py --target, --iclass and --ras sweeps up to the BTB forwarding and
+# pipelined RAS updates of the RTL.  The addresses of the non-CFI instructions the
+# class predictor looks up are rebuilt from the gap counts, assuming the 4-byte
+# instructions of each gap come before the compressed ones.
+#   BranchSim.py -f cfi.log -p btb:6 btb:8 btb:10 btb:12 btb:14 btb:16
+#   BranchSim.py -f cfi.log -p ras:2 ras:3 ras:4 ras:6 ras:10 ras:16
+# Add --refdata to print the twobit and gshare 6..16 sweep as the RefDataBP table of
+# parseHPMC.py, and with cfi.logs the btb 6..16 sweep as RefDataBTB.
+
+import os
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from CacheSim import HEXVALUE, POLICIES
+from SeparateBranch import benchmarkname, loadindex
+
+# one benchmark of a branch log.  pc and taken hold every branch from
+# TRAIN (or the start of the file) to END; branches before start are
+# only used to train the predictors.
+class BranchTrace:
+    def __init__(self, name, opt, pc, taken, start=0):
+        self.name = name
+        self.opt = opt
+        self.pc = pc
+        self.taken = taken
+        self.start = start
+
+    def __len__(self):
+        return len(self.pc)
+
+# parses whole lines of a branch log held in a uint8 array, returning the
+# PC and direction of every branch and the (branches before it, text) of
+# every TRAIN, BEGIN and END line.  The addresses are decoded in bulk as
+# in CacheSim.parsetextlines.
+def parsebranchlines(data, chunklines=1 << 20):
+    newlines = np.flatnonzero(data == ord('\n'))
+    if len(data) > 0 and data[-1] != ord('\n'):
+        newlines = np.append(newlines, len(data))
+    starts = np.concatenate(([0], newlines[:-1] + 1)).astype(np.int64)
+    ends = newlines.astype(np.int64)
+    ends -= (ends > starts) & (data[np.maximum(ends - 1, 0)] == ord('\r'))
+    keep = ends > starts
+    starts = starts[keep]
+    ends = ends[keep]
+
+    first = data[starts]
+    ismarker = (first >= ord('A')) & (first <= ord('Z'))
+    isbranch = ~ismarker & (ends - starts >= 3)
+    branchrows = np.flatnonzero(isbranch)
+
+    pc = np.zeros(len(branchrows), dtype=np.uint64)
+    for chunk in range(0, len(branchrows), chunklines):
+        chunkrows = branchrows[chunk:chunk + chunklines]
+        hexend = ends[chunkrows] - 2
+        hexlen = hexend - starts[chunkrows]
+        digit = np.arange(int(hexlen.max()))
+        present = digit < hexlen[:, None]
+        positions = np.where(present, hexend[:, None] - 1 - digit, 0)
+        nibbles = HEXVALUE[data[positions]] * present
+        pc[chunk:chunk + len(chunkrows)] = (nibbles << (4*digit).astype(np.uint64)).sum(axis=1, dtype=np.uint64)
+    taken = data[ends[branchrows] - 1] == ord('t')
+
+    before = np.cumsum(isbranch) - isbranch
+    markers = [(int(before[row]), bytes(data[starts[row]:ends[row]]).decode(errors='replace'))
+               for row in np.flatnonzero(ismarker).tolist()]
+    return (pc, taken, markers)
+
+# reads a BPRED_LOGGER log in blocks and yields a BranchTrace for each
+# benchmark as soon as its END line is read, so only one benchmark is
+# held in memory and the log is read once.  start and stop limit the
+# read to a byte range of the log, such as a segment of its index.
+def iterbranchlog(path, countwarmup=False, start=0, stop=None, blockbytes=1 << 26):
+    pieces = [] # (pc, taken) arrays of the benchmark being read
+    count = 0 # branches in pieces
+    (begin, memfile, found) = (None, None, False)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        (carry, remaining) = (b'', float('inf') if stop is None else stop - start)
+        while True:
+            block = f.read(int(min(blockbytes, remaining)))
+            remaining -= len(block)
+            data = carry + block
+            if block:
+                cut = data.rfind(b'\n') + 1
+                (data, carry) = (data[:cut], data[cut:])
+            if data:
+                (pc, taken, markers) = parsebranchlines(np.frombuffer(data, dtype=np.uint8))
+                last = 0
+                for (position, text) in markers:
+                    pieces.append((pc[last:position], taken[last:position]))
+                    count += position - last
+                    last = position
+                    if text.startswith('TRAIN'):
+                        (pieces, count, begin) = ([], 0, None)
+                    elif text.startswith('BEGIN'):
+                        begin = count
+                        memfile = text[6:].strip()
+                    elif text.startswith('END'):
+                        (name, opt) = benchmarkname(text[4:].strip() or memfile or path)
+                        start = 0 if countwarmup else (count if begin is None else begin)
+                        yield BranchTrace(name, opt, *joinpieces(pieces), start)
+                        (pieces, count, begin, found) = ([], 0, None, True)
+                pieces.append((pc[last:], taken[last:]))
+                count += len(pc) - last
+            if not block:
+                break
+    if not found:
+        name = os.path.basename(path).split('.')[0]
+        start = 0 if countwarmup or begin is None else begin
+        yield BranchTrace(name, '', *joinpieces(pieces), start)
+
+def joinpieces(pieces):
+    if not pieces:
+        return (np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=bool))
+    return (np.concatenate([pc for (pc, taken) in pieces]), np.concatenate([taken for (pc, taken) in pieces]))
+
+# returns a BranchTrace per benchmark of a BPRED_LOGGER log
+def readbranchlog(path, countwarmup=False):
+    return list(iterbranchlog(path, countwarmup))
+
+# one benchmark of a cfi.log: a (pc, taken, target, class, length, gap)
+# row for every control flow instruction, where class is the
+# {call, return, jump, branch} bits, length is 2 or 4 bytes and gap is
+# the number of other instructions retired since the previous one
+class CFITrace:
+    def __init__(self, name, opt, rows, start=0):
+        self.name = name
+        self.opt = opt
+        self.rows = rows
+        self.start = start
+
+    def __len__(self):
+        return len(self.rows)
+
+    # the conditional branches as a BranchTrace for the direction predictors
+    def branchtrace(self):
+        branches = [(pc, taken) for (pc, taken, target, iclass, length, gap) in self.rows if iclass & 1]
+        start = sum(1 for row in self.rows[:self.start] if row[3] & 1)
+        pc = np.array([pc for (pc, taken) in branches], dtype=np.uint64)
+        taken = np.array([taken for (pc, taken) in branches], dtype=bool)
+        return BranchTrace(self.name, self.opt, pc, taken, start)
+
+CFIFIELDS = 6
+
+# reads a cfi.log and yields a CFITrace for each benchmark, splitting and
+# counting the training instructions as iterbranchlog does
+def itercfilog(path, countwarmup=False, start=0, stop=None):
+    (rows, begin, memfile, found) = ([], None, None, False)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        position = start
+        for line in f:
+            if stop is not None and position >= stop:
+                break
+            position += len(line)
+            line = line.decode(errors='replace')
+            fields = line.split()
+            if not fields:
+                continue
+            if fields[0].startswith('TRAIN'):
+                (rows, begin) = ([], None)
+            elif fields[0].startswith('BEGIN'):
+                begin = len(rows)
+                memfile = line[6:].strip()
+            elif fields[0].startswith('END'):
+                (name, opt) = benchmarkname(line[4:].strip() or memfile or path)
+                start = 0 if countwarmup else (len(rows) if begin is None else begin)
+                yield CFITrace(name, opt, rows, start)
+                (rows, begin, found) = ([], None, True)
+            elif len(fields) < CFIFIELDS:
+                raise ValueError(path + " has no CFI targets and classes; regenerate it with the current loggers.sv")
+            else:
+                rows.append((int(fields[0], 16), fields[1] == 't', int(fields[2], 16), int(fields[3], 16),
+                             int(fields[4]), int(fields[5])))
+    if not found:
+        name = os.path.basename(path).split('.')[0]
+        start = 0 if countwarmup or begin is None else begin
+        yield CFITrace(name, '', rows, start)
+
+# returns True if the first branch line of a log has the cfi.log fields
+def iscfilog(path):
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if fields and not fields[0][0].isupper():
+                return len(fields) >= CFIFIELDS
+    return False
+
+# returns {PC[k+1]^PC[1], PC[k:2]}, the PC index of a 2^k entry table in Wally
+def pcindex(pc, k):
+    return ((pc >> 2) & ((1 << k) - 1)) ^ (((pc >> 1) & 1) << (k - 1))
+
+WEAKLYTAKEN = 2
+
+# 2^k two-bit counters indexed by the PC
+class TwoBitPredictor:
+    def __init__(self, k):
+        self.k = k
+        self.counters = bytearray([WEAKLYTAKEN]) * (1 << k)
+
+    # runs the branches through the predictor and returns a bytearray
+    # with a 1 for every mispredicted branch
+    def run(self, pcs, taken):
+        wrong = bytearray(len(pcs))
+        (counters, k) = (self.counters, self.k)
+        for (n, (pc, outcome)) in enumerate(zip(pcs.tolist(), taken.tolist())):
+            index = pcindex(pc, k)
+            counter = counters[index]
+            if (counter >= 2) != outcome:
+                wrong[n] = 1
+            if outcome:
+                if counter < 3:
+                    counters[index] = counter + 1
+            elif counter > 0:
+                counters[index] = counter - 1
+        return wrong
+
+# 2^k counters indexed by the PC index xor (gshare) or just (global) k bits of history
+class GsharePredictor(TwoBitPredictor):
+    usepc = True
+
+    def __init__(self, k):
+        super().__init__(k)
+        self.ghr = 0
+
+    def run(self, pcs, taken):
+        wrong = bytearray(len(pcs))
+        counters = self.counters
+        (k, ghr, usepc) = (self.k, self.ghr, self.usepc)
+        msb = 1 << (k - 1)
+        for (n, (pc, outcome)) in enumerate(zip(pcs.tolist(), taken.tolist())):
+            index = ghr ^ pcindex(pc, k) if usepc else ghr
+            counter = counters[index]
+            if (counter >= 2) != outcome:
+                wrong[n] = 1
+            if outcome:
+                if counter < 3:
+                    counters[index] = counter + 1
+            elif counter > 0:
+                counters[index] = counter - 1
+            ghr = (ghr >> 1) | (msb if outcome else 0)
+        self.ghr = ghr
+        return wrong
+
+class GlobalPredictor(GsharePredictor):
+    usepc = False
+
+# 2^m local histories of k bits, indexed by the PC, selecting one of 2^k counters
+class LocalPredictor:
+    def __init__(self, m, k):
+        self.m = m
+        self.k = k
+        self.histories = [0]*(1 << m)
+        self.counters = bytearray([WEAKLYTAKEN]) * (1 << k)
+
+    def run(self, pcs, taken):
+        wrong = bytearray(len(pcs))
+        (counters, histories, m) = (self.counters, self.histories, self.m)
+        msb = 1 << (self.k - 1)
+        for (n, (pc, outcome)) in enumerate(zip(pcs.tolist(), taken.tolist())):
+            slot = pcindex(pc, m)
+            index = histories[slot]
+            counter = counters[index]
+            if (counter >= 2) != outcome:
+                wrong[n] = 1
+            if outcome:
+                if counter < 3:
+                    counters[index] = counter + 1
+            elif counter > 0:
+                counters[index] = counter - 1
+            histories[slot] = (index >> 1) | (msb if outcome else 0)
+        return wrong
+
+# the outcomes of the branches start+1 to stop back from every branch,
+# xor-folded into bits bits with the newest in bit 0.  Each branch
+# contributes to a running xor pre-rotated by its position, so every
+# window is the xor of two prefixes rotated back into place.
+def foldedhistory(taken, start, stop, bits):
+    count = len(taken)
+    position = np.arange(count, dtype=np.int64)
+    contribution = taken.astype(np.uint64) << ((-position) % bits).astype(np.uint64)
+    prefix = np.concatenate((np.zeros(1, dtype=np.uint64), np.bitwise_xor.accumulate(contribution)))
+    window = prefix[np.maximum(position - start, 0)] ^ prefix[np.maximum(position - stop, 0)]
+    rotate = ((position - 1) % bits).astype(np.uint64)
+    mask = np.uint64((1 << bits) - 1)
+    return ((window << rotate) | (window >> (np.uint64(bits) - rotate))) & mask
+
+# the history lengths of n tables, growing geometrically from shortest to longest
+def geometriclengths(n, shortest, longest):
+    if n == 1:
+        return [shortest]
+    return [int(round(shortest * (longest/shortest) ** (t/(n - 1)))) for t in range(n)]
+
+# TAGE (Seznec and Michaud, JILP 2006): a 2^k entry bimodal base predictor
+# and n tagged tables of 2^k entries, each indexed and tagged by the PC
+# hashed with a geometrically longer global history.  Entries hold a
+# 3-bit counter, a tag and a 2-bit useful counter.  The longest hitting
+# table provides the prediction; on a misprediction an entry is allocated
+# in the first longer table with a free entry, or the useful counters of
+# the longer tables are decayed.  Useful counters halve every 2^18 branches.
+class TAGEPredictor:
+    RESETPERIOD = 1 << 18
+
+    def __init__(self, k, n, shortest=4, longest=64, tagbits=8):
+        self.k = k
+        self.n = n
+        self.lengths = geometriclengths(n, shortest, longest)
+        self.tagbits = tagbits
+
+    def run(self, pcs, taken):
+        (k, n, tagbits) = (self.k, self.n, self.tagbits)
+        count = len(pcs)
+        wrong = bytearray(count)
+        pcbits = pcindex(pcs, k)
+        indexes = [(pcbits ^ foldedhistory(taken, 0, length, k)).tolist() for length in self.lengths]
+        tags = [(((pcs >> np.uint64(2)) ^ foldedhistory(taken, 0, length, tagbits) ^
+                  (foldedhistory(taken, 0, length, tagbits - 1) << np.uint64(1))) & np.uint64((1 << tagbits) - 1)).tolist()
+                for length in self.lengths]
+        base = bytearray([WEAKLYTAKEN]) * (1 << k)
+        counters = [bytearray([4]) * (1 << k) for t in range(n)]
+        useful = [bytearray(1 << k) for t in range(n)]
+        entrytags = [[-1] * (1 << k) for t in range(n)]
+        for (b, (pc, outcome)) in enumerate(zip(pcbits.tolist(), taken.tolist())):
+            (provider, alternate) = (-1, -1)
+            for t in range(n - 1, -1, -1):
+                if entrytags[t][indexes[t][b]] == tags[t][b]:
+                    if provider < 0:
+                        provider = t
+                    else:
+                        alternate = t
+                        break
+            basepred = base[pc] >= 2
+            altpred = counters[alternate][indexes[alternate][b]] >= 4 if alternate >= 0 else basepred
+            if provider >= 0:
+                index = indexes[provider][b]
+                counter = counters[provider][index]
+                prediction = counter >= 4
+                if outcome:
+                    counters[provider][index] = min(counter + 1, 7)
+                else:
+                    counters[provider][index] = max(counter - 1, 0)
+                if prediction != altpred:
+                    if prediction == outcome:
+                        useful[provider][index] = min(useful[provider][index] + 1, 3)
+                    else:
+                        useful[provider][index] = max(useful[provider][index] - 1, 0)
+            else:
+                prediction = basepred
+                counter = base[pc]
+                if outcome:
+                    if counter < 3:
+                        base[pc] = counter + 1
+                elif counter > 0:
+                    base[pc] = counter - 1
+            if prediction != outcome:
+                wrong[b] = 1
+                longer = range(provider + 1, n)
+                free = [t for t in longer if useful[t][indexes[t][b]] == 0]
+                if free:
+                    t = free[0]
+                    index = indexes[t][b]
+                    entrytags[t][index] = tags[t][b]
+                    counters[t][index] = 4 if outcome else 3
+                else:
+                    for t in longer:
+                        useful[t][indexes[t][b]] -= 1
+            if (b + 1) % self.RESETPERIOD == 0:
+                for table in useful:
+                    table[:] = bytes(u >> 1 for u in table)
+        return wrong
+
+# hashed perceptron (Tarjan and Skadron, TACO 2005): n tables of 2^k
+# 8-bit weights, each indexed by the PC xor one of n equal slices of h
+# bits of global history folded to k bits, plus a bias table indexed by
+# the PC.  A branch is predicted taken when the weights sum to at least
+# 0 and the weights are trained when it is mispredicted or the sum is
+# within the threshold.
+class PerceptronPredictor:
+    def __init__(self, k, h, n=8):
+        self.k = k
+        self.h = h
+        self.n = min(n, h)
+        self.threshold = int(1.93*(self.n + 1) + 14)
+
+    def run(self, pcs, taken):
+        (k, h, n, threshold) = (self.k, self.h, self.n, self.threshold)
+        wrong = bytearray(len(pcs))
+        pcbits = pcindex(pcs, k)
+        size = 1 << k
+        columns = [pcbits.astype(np.int64)]
+        for t in range(n):
+            column = pcbits ^ foldedhistory(taken, t*h // n, (t + 1)*h // n, k)
+            columns.append(column.astype(np.int64) + (t + 1)*size)
+        rows = np.stack(columns, axis=1).tolist()
+        weights = [0] * ((n + 1) * size)
+        for (b, (row, outcome)) in enumerate(zip(rows, taken.tolist())):
+            total = sum([weights[index] for index in row])
+            if (total >= 0) != outcome:
+                wrong[b] = 1
+            elif abs(total) > threshold:
+                continue
+            if outcome:
+                for index in row:
+                    if weights[index] < 127:
+                        weights[index] += 1
+            else:
+                for index in row:
+                    if weights[index] > -128:
+                        weights[index] -= 1
+        return wrong
+
+# a loop predictor of 2^m direct-mapped, tagged entries in front of a
+# gshare:k base predictor.  Each entry counts the taken iterations of a
+# branch and learns the trip count at which it falls through; once the
+# same trip count has been seen LOOPCONFIDENT times in a row the entry
+# overrides the base prediction.  Base mispredictions allocate entries,
+# replacing only those whose age has decayed to 0.
+class LoopPredictor:
+    TAGBITS = 10
+    COUNTBITS = 10
+    LOOPCONFIDENT = 3
+    MAXAGE = 3
+    ENTRYBITS = TAGBITS + 2*COUNTBITS + 2 + 2 # tag, trip and iteration counts, confidence, age
+
+    def __init__(self, m, k):
+        self.m = m
+        self.k = k
+
+    def run(self, pcs, taken):
+        m = self.m
+        basewrong = GsharePredictor(self.k).run(pcs, taken)
+        wrong = bytearray(len(pcs))
+        slots = pcindex(pcs, m).tolist()
+        tags = ((pcs >> np.uint64(m + 2)) & np.uint64((1 << self.TAGBITS) - 1)).tolist()
+        maxcount = (1 << self.COUNTBITS) - 1
+        entrytags = [-1] * (1 << m)
+        trips = [0] * (1 << m)
+        iterations = [0] * (1 << m)
+        confidence = [0] * (1 << m)
+        ages = [0] * (1 << m)
+        for (b, (slot, tag, outcome)) in enumerate(zip(slots, tags, taken.tolist())):
+            prediction = outcome ^ basewrong[b]
+            if entrytags[slot] == tag:
+                if confidence[slot] == self.LOOPCONFIDENT:
+                    loopprediction = iterations[slot] < trips[slot]
+                    if loopprediction == outcome and prediction != outcome:
+                        ages[slot] = min(ages[slot] + 1, self.MAXAGE)
+                    prediction = loopprediction
+                if outcome:
+                    iterations[slot] += 1
+                    if iterations[slot] > maxcount:
+                        entrytags[slot] = -1
+                    elif iterations[slot] > trips[slot] and confidence[slot]:
+                        confidence[slot] = 0
+                else:
+                    if iterations[slot] == trips[slot]:
+                        confidence[slot] = min(confidence[slot] + 1, self.LOOPCONFIDENT)
+                    else:
+                        (trips[slot], confidence[slot]) = (iterations[slot], 0)
+                    iterations[slot] = 0
+            elif basewrong[b]:
+                if ages[slot]:
+                    ages[slot] -= 1
+                else:
+                    (entrytags[slot], trips[slot], confidence[slot], ages[slot]) = (tag, 0, 0, self.MAXAGE)
+                    iterations[slot] = 1 if outcome else 0
+            wrong[b] = prediction != outcome
+        return wrong
+
+PREDICTORS = {'twobit': TwoBitPredictor, 'bimodal': TwoBitPredictor, 'gshare': GsharePredictor,
+              'global': GlobalPredictor, 'local': LocalPredictor, 'yehpatt': LocalPredictor,
+              'tage': TAGEPredictor, 'perceptron': PerceptronPredictor, 'loop': LoopPredictor}
+# the predictors made only of two-bit counter tables, which sweep runs together
+TABLEPREDICTORS = ['twobit', 'gshare', 'global', 'local']
+
+# the numbers of parameters a predictor takes, when not 1
+PARAMCOUNTS = {'local': [2], 'tage': [2, 4, 5], 'perceptron': [2, 3], 'loop': [2]}
+
+# splits a <type>:<params> predictor name into (type, [params])
+def parsepredictor(text):
+    fields = text.split(':')
+    kind = {'bimodal': 'twobit', 'yehpatt': 'local'}.get(fields[0], fields[0])
+    params = fields[1:]
+    if kind in ('btb', 'class') and 1 <= len(params) <= 3:
+        valid = all(param.isdigit() for param in params[:2]) and (len(params) < 3 or params[2] in POLICIES)
+        ways = int(params[1]) if valid and len(params) > 1 else 1
+        if valid and ways >= 1 and ways & (ways - 1) == 0 and ways <= 2**int(params[0]):
+            return (kind, params)
+    elif (kind in PREDICTORS or kind in CFIPREDICTORS) and len(params) in PARAMCOUNTS.get(kind, [1]) and \
+         all(param.isdigit() for param in params):
+        return (kind, params)
+    raise argparse.ArgumentTypeError("unknown predictor " + text + "; expected twobit:k, gshare:k, global:k, local:m:k, " +
+                                     "tage:k:n[:shortest:longest[:tagbits]], perceptron:k:h[:n], loop:m:k, " +
+                                     "btb:k[:ways[:policy]], class:k[:ways[:policy]] or ras:n")
+
+# the table entries and bits of a predictor, as ComputePredNumEntries and
+# ComputePredSize in parseHPMC.py count them
+def predentries(kind, params):
+    if kind in ('tage', 'perceptron'):
+        tables = int(params[1]) if kind == 'tage' else makepredictor(kind, params).n
+        return (tables + 1) * 2**int(params[0])
+    if kind == 'loop':
+        return 2**int(params[0]) + 2**int(params[1])
+    if kind == 'ras':
+        return int(params[0])
+    if kind == 'local':
+        return 2**int(params[0]) * int(params[1]) + 2**int(params[1])
+    return 2**int(params[0])
+
+def predsize(kind, params):
+    if kind == 'tage':
+        tage = makepredictor(kind, params)
+        return 2*2**tage.k + tage.n * 2**tage.k * (3 + tage.tagbits + 2)
+    if kind == 'perceptron':
+        perceptron = makepredictor(kind, params)
+        return 8 * (perceptron.n + 1) * 2**perceptron.k + perceptron.h
+    if kind == 'loop':
+        return 2**int(params[0]) * LoopPredictor.ENTRYBITS + 2*2**int(params[1])
+    if kind == 'ras':
+        return int(params[0])
+    if kind == 'local':
+        return 2**int(params[0]) * int(params[1]) + 2*2**int(params[1])
+    return 2*2**int(params[0])
+
+# the name parseHPMC.py gives a predictor configuration
+def predname(kind, params):
+    return kind + '_'.join(params)
+
+def makepredictor(kind, params):
+    model = PREDICTORS.get(kind) or CFIPREDICTORS[kind]
+    return model(*[int(param) if param.isdigit() else param for param in params])
+
+# returns the BDMR of every predictor on a benchmark, each starting empty
+# and run on its own
+def simulate(trace, predictors):
+    bdmrs = []
+    measured = len(trace) - trace.start
+    for (kind, params) in predictors:
+        wrong = makepredictor(kind, params).run(trace.pc, trace.taken)
+        misses = wrong.count(1, trace.start) if measured else 0
+        bdmrs.append(100.0 * misses / measured if measured else 0.0)
+    return bdmrs
+
+# the global history before every branch: the last bits outcomes with
+# the newest in the msb, as the GHR of a bits-wide predictor holds it.
+# A k-bit predictor's GHR is the top k bits of the widest one.
+def globalhistory(taken, bits):
+    history = np.zeros(len(taken), dtype=np.uint64)
+    for age in range(1, min(bits, len(taken)) + 1):
+        history[age:] |= taken[:-age].astype(np.uint64) << np.uint64(bits - age)
+    return history
+
+# the bits-wide local history before every branch, kept per 2^m PC index
+def localhistory(pc, taken, m, bits):
+    slot = pcindex(pc, m)
+    order = np.argsort(slot, kind='stable')
+    (slots, outcomes) = (slot[order], taken[order].astype(np.uint64))
+    history = np.zeros(len(taken), dtype=np.uint64)
+    for age in range(1, min(bits, len(taken)) + 1):
+        same = slots[age:] == slots[:-age]
+        history[age:] |= (outcomes[:-age] * same) << np.uint64(bits - age)
+    unsorted = np.empty_like(history)
+    unsorted[order] = history
+    return unsorted
+
+# bits of the counter table index of a predictor
+def indexbits(kind, params):
+    return int(params[1]) if kind == 'local' else int(params[0])
+
+INCREMENT = np.array([1, 2, 3, 3], dtype=np.uint8)
+DECREMENT = np.array([0, 0, 1, 2], dtype=np.uint8)
+
+# returns the BDMR of every predictor on a benchmark like simulate, but in
+# one pass: every predictor is a table of two-bit counters, so the tables
+# are laid end to end in one NumPy array and each branch updates its
+# counter in every table at once.  The table indexes are computed up
+# front from one shared global history and one local history per PC
+# index width.
+def sweep(trace, predictors, chunklines=1 << 16):
+    (pc, taken) = (trace.pc, trace.taken)
+    sizes = [1 << indexbits(kind, params) for (kind, params) in predictors]
+    offsets = np.cumsum([0] + sizes[:-1]).tolist()
+    counters = np.full(sum(sizes), WEAKLYTAKEN, dtype=np.uint8)
+    wrong = np.zeros(len(predictors), dtype=np.int64)
+
+    ghrbits = max([int(params[0]) for (kind, params) in predictors if kind in ('gshare', 'global')], default=0)
+    ghr = globalhistory(taken, ghrbits)
+    lhrbits = {}
+    for (kind, params) in predictors:
+        if kind == 'local':
+            lhrbits[int(params[0])] = max(lhrbits.get(int(params[0]), 0), int(params[1]))
+    lhrs = {m: localhistory(pc, taken, m, bits) for (m, bits) in lhrbits.items()}
+
+    for chunk in range(0, len(trace), chunklines):
+        span = slice(chunk, chunk + chunklines)
+        columns = []
+        for ((kind, params), offset) in zip(predictors, offsets):
+            k = indexbits(kind, params)
+            if kind == 'twobit':
+                index = pcindex(pc[span], k)
+            elif kind == 'gshare':
+                index = (ghr[span] >> np.uint64(ghrbits - k)) ^ pcindex(pc[span], k)
+            elif kind == 'global':
+                index = ghr[span] >> np.uint64(ghrbits - k)
+            else:
+                m = int(params[0])
+                index = lhrs[m][span] >> np.uint64(lhrbits[m] - k)
+            columns.append(index.astype(np.int64) + offset)
+        indexes = np.stack(columns, axis=1)
+        for (n, (row, outcome)) in enumerate(zip(indexes, taken[span].tolist()), chunk):
+            state = counters[row]
+            if outcome:
+                counters[row] = INCREMENT[state]
+                if n >= trace.start:
+                    wrong += state < 2
+            else:
+                counters[row] = DECREMENT[state]
+                if n >= trace.start:
+                    wrong += state >= 2
+    measured = len(trace) - trace.start
+    return [100.0 * misses / measured if measured else 0.0 for misses in wrong.tolist()]
+
+CALL = 8
+RETURN = 4
+JUMP = 2
+BRANCH = 1
+
+# the PCs of the gap non-CFI instructions between the instruction after
+# prev and the CFI at pc.  The log does not hold their lengths, so the
+# 4-byte ones are assumed to come first; gaps that do not fit the span,
+# as after a trap, are skipped.
+def gappcs(prev, pc, gap):
+    (prevpc, taken, target, iclass, length, prevgap) = prev
+    nextpc = target if taken else prevpc + length
+    span = pc - nextpc
+    four = (span - 2*gap) // 2
+    if gap == 0 or span % 2 or four < 0 or four > gap:
+        return []
+    return [nextpc + 4*n for n in range(four)] + [nextpc + 4*four + 2*n for n in range(gap - four)]
+
+# 2^k BTB entries of {class, target}.  With one way the BTB is Wally's:
+# direct mapped, untagged and indexed like the direction predictors.
+# With more ways it is tagged with the whole PC and replaced with a
+# CacheSim.py policy.  An entry is rewritten whenever its target is
+# wrong for a branch or a jump that is not a return, or, when classpred
+# is set (INSTR_CLASS_PRED=1), whenever the class it predicts is wrong.
+class BTB:
+    classpred = False
+
+    def __init__(self, k, ways=1, policy='lru'):
+        self.k = k
+        self.ways = ways
+        self.sets = (1 << k) // ways
+        self.setbits = self.sets.bit_length() - 1
+        self.entries = [(0, 0)] * (1 << k) # (class, target)
+        self.tags = [None] * (1 << k)
+        if ways > 1:
+            self.policy = POLICIES[policy](self.sets, ways)
+
+    # returns the entry number holding pc, or None on a miss
+    def lookup(self, pc):
+        if self.ways == 1:
+            return pcindex(pc, self.k)
+        base = pcindex(pc, self.setbits) * self.ways if self.setbits else 0
+        try:
+            line = self.tags.index(pc, base, base + self.ways)
+        except ValueError:
+            return None
+        self.policy.touch(base // self.ways, line - base)
+        return line
+
+    def write(self, line, pc, entry):
+        if line is None:
+            setnum = pcindex(pc, self.setbits) if self.setbits else 0
+            waynum = self.policy.victim(setnum)
+            line = setnum*self.ways + waynum
+            self.tags[line] = pc
+            self.policy.fill(setnum, waynum)
+        self.entries[line] = entry
+
+    # runs a benchmark through the BTB and returns (wrong, total) for the
+    # BTMR, or for the ClassMPR if classpred is set
+    def run(self, trace):
+        (targetwrong, targets, classwrong, instructions) = (0, 0, 0, 0)
+        prev = None
+        for (n, row) in enumerate(trace.rows):
+            (pc, taken, target, iclass, length, gap) = row
+            measured = n >= trace.start
+            if self.classpred:
+                if prev is not None:
+                    for gappc in gappcs(prev, pc, gap):
+                        line = self.lookup(gappc)
+                        if line is not None and self.entries[line][0]:
+                            classwrong += measured
+                            self.write(line, gappc, (0, 0))
+                instructions += measured * (gap + 1)
+            line = self.lookup(pc)
+            (predclass, predtarget) = self.entries[line] if line is not None else (0, None)
+            wrongclass = self.classpred and predclass != iclass
+            wrongtarget = predtarget != target and (iclass & BRANCH or iclass & JUMP and not iclass & RETURN)
+            if measured:
+                classwrong += wrongclass
+                if iclass & BRANCH or iclass & JUMP and not iclass & RETURN:
+                    targets += 1
+                    targetwrong += wrongtarget and taken
+            if wrongtarget or wrongclass:
+                self.write(line, pc, (iclass, target))
+            prev = row
+        return (classwrong, instructions) if self.classpred else (targetwrong, targets)
+
+class ClassPredictor(BTB):
+    classpred = True
+
+# Wally's return address stack of n entries: a call pushes the address
+# after it and a return pops, both moving a pointer that wraps around
+# the stack like the one in RASPredictor.sv
+class RAS:
+    def __init__(self, n):
+        self.n = n
+        self.mask = (1 << (n - 1).bit_length()) - 1
+        self.memory = [0] * n
+        self.ptr = 0
+
+    def move(self, step):
+        ptr = (self.ptr + step) & self.mask
+        self.ptr = 0 if ptr >= self.n else ptr
+
+    # returns (wrong, total) for the RASMPR of a benchmark
+    def run(self, trace):
+        (wrong, returns) = (0, 0)
+        for (n, (pc, taken, target, iclass, length, gap)) in enumerate(trace.rows):
+            if iclass & RETURN:
+                if n >= trace.start:
+                    returns += 1
+                    wrong += taken and self.memory[self.ptr] != target
+                self.move(-1)
+            if iclass & CALL:
+                self.move(1)
+                self.memory[self.ptr] = pc + length
+        return (wrong, returns)
+
+CFIPREDICTORS = {'btb': BTB, 'class': ClassPredictor, 'ras': RAS}
+
+# returns the BTMR, ClassMPR or RASMPR of every BTB, class or RAS predictor
+# on a benchmark
+def simulatecfi(trace, predictors):
+    rates = []
+    for (kind, params) in predictors:
+        (wrong, total) = makepredictor(kind, params).run(trace)
+        rates.append(100.0 * wrong / total if total else 0.0)
+    return rates
+
+# the geometric mean as ComputeGeometricAverage in parseHPMC.py takes it:
+# zero rates are left out of the product but still counted
+def geometricmean(values):
+    product = 1.0
+    for value in values:
+        if value != 0:
+            product *= value
+    return product ** (1.0/len(values)) if values else 0.0
+
+# simulates every benchmark and returns ([(name, opt, rates)], means), where
+# the rates are BDMRs for direction predictors and BTMRs, ClassMPRs or
+# RASMPRs for the BTB, class and RAS predictors
+def evaluate(traces, predictors):
+    results = [(trace.name, trace.opt, simulatetrace(trace, predictors)) for trace in traces]
+    return (results, columnmeans(results, len(predictors)))
+
+def columnmeans(results, columns):
+    return [geometricmean([rates[column] for (name, opt, rates) in results]) for column in range(columns)]
+
+# returns the rate of every predictor on one benchmark
+def simulatetrace(trace, predictors):
+    tables = [column for (column, (kind, params)) in enumerate(predictors) if kind in TABLEPREDICTORS]
+    others = [column for (column, (kind, params)) in enumerate(predictors) if kind in PREDICTORS and kind not in TABLEPREDICTORS]
+    cfi = [column for (column, (kind, params)) in enumerate(predictors) if kind in CFIPREDICTORS]
+    rates = [0.0] * len(predictors)
+    branches = trace.branchtrace() if isinstance(trace, CFITrace) else trace
+    if tables:
+        for (column, rate) in zip(tables, sweep(branches, [predictors[column] for column in tables])):
+            rates[column] = rate
+    if others:
+        for (column, rate) in zip(others, simulate(branches, [predictors[column] for column in others])):
+            rates[column] = rate
+    if cfi:
+        for (column, rate) in zip(cfi, simulatecfi(trace, [predictors[column] for column in cfi])):
+            rates[column] = rate
+    return rates
+
+# simulates the benchmarks of one segment of a log, or the whole log if
+# segment is None; runs in a worker process with -j
+def simulatesegment(task):
+    (path, reader, segment, countwarmup, predictors) = task
+    (start, stop) = (segment['start'], segment['stop']) if segment else (0, None)
+    return [(trace.name, trace.opt, simulatetrace(trace, predictors)) for trace in reader(path, countwarmup, start, stop)]
+
+def printtable(results, means, predictors):
+    names = [predname(kind, params) for (kind, params) in predictors]
+    print("%-24s" % "benchmark" + "".join("%12s" % name for name in names))
+    print("%-24s" % "bits" + "".join("%12d" % predsize(kind, params) for (kind, params) in predictors))
+    for (name, opt, bdmrs) in results:
+        print("%-24s" % name[:24] + "".join("%12.4f" % bdmr for bdmr in bdmrs))
+    print("%-24s" % "Mean" + "".join("%12.4f" % mean for mean in means))
+
+# prints the geometric mean of each predictor on its own line after its name,
+# the form CModelBranchAccuracy.sh has always printed
+def printmeans(means, predictors):
+    for ((kind, params), mean) in zip(predictors, means):
+        print("%s %s" % (predname(kind, params), float(mean)))
+
+# prints the geometric means in the form of the RefDataBP or RefDataBTB table in parseHPMC.py
+def printrefdata(means, predictors, variable='RefDataBP'):
+    entries = []
+    for ((kind, params), mean) in zip(predictors, means):
+        model = {'btb': 'BTB'}.get(kind, kind) + 'CModel'
+        entries.append((predname(kind, params).replace(kind, model, 1), model,
+                        predentries(kind, params), predsize(kind, params), mean))
+    print(variable + " = " + repr(entries))
+
+REFDATAPREDICTORS = [(kind, [str(size)]) for kind in ['twobit', 'gshare'] for size in range(6, 17, 2)]
+REFDATABTBPREDICTORS = [('btb', [str(size)]) for size in range(6, 17, 2)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulates branch predictors on a BPRED_LOGGER branch.log or cfi.log.")
+    parser.add_argument('-f', "--file", nargs='+', required=True, help="branch.log or cfi.log files, or logs already split per benchmark")
+    parser.add_argument('-p', "--predictor", type=parsepredictor, nargs='+', default=[('gshare', ['10'])],
+                        help="Predictors to simulate as type:params, e.g. twobit:10 gshare:10 global:10 local:6:4 btb:10 class:10 ras:16 (default gshare:10)")
+    parser.add_argument("--countwarmup", action='store_true', help="Also count the branches between TRAIN and BEGIN")
+    parser.add_argument("--refdata", action='store_true', help="Print the twobit/gshare 6..16 sweep as parseHPMC.py's RefDataBP, and with cfi.logs the btb 6..16 sweep as RefDataBTB")
+    parser.add_argument("--means", action='store_true', help="Print only a 'name mean' line for each predictor instead of the table")
+    parser.add_argument('-b', "--benchmark", nargs='+', help="Only simulate these benchmarks, found through the log's index")
+    parser.add_argument('-j', "--jobs", type=int, default=1, help="Simulate the benchmarks of the log's index in this many processes")
+    args = parser.parse_args()
+
+    paths = [os.path.expanduser(path) for path in args.file]
+    readers = [itercfilog if iscfilog(path) else iterbranchlog for path in paths]
+    cfilogs = all(reader == itercfilog for reader in readers)
+    predictors = (REFDATAPREDICTORS + (REFDATABTBPREDICTORS if cfilogs else [])) if args.refdata else args.predictor
+    if not cfilogs and any(kind in CFIPREDICTORS for (kind, params) in predictors):
+        parser.error("btb, class and ras predictors need cfi.log files written by the current loggers.sv")
+    if args.benchmark or args.jobs > 1:
+        tasks = []
+        for (path, reader) in zip(paths, readers):
+            segments = loadindex(path) or [None]
+            tasks.extend((path, reader, segment, args.countwarmup, predictors) for segment in segments
+                         if not args.benchmark or segment and segment['name'] in args.benchmark)
+        with multiprocessing.Pool(args.jobs) as pool:
+            results = [result for segment in pool.imap(simulatesegment, tasks) for result in segment]
+        means = columnmeans(results, len(predictors))
+    else:
+        traces = (trace for (path, reader) in zip(paths, readers) for trace in reader(path, args.countwarmup))
+        (results, means) = evaluate(traces, predictors)
+    if args.refdata:
+        printrefdata(means[:len(REFDATAPREDICTORS)], REFDATAPREDICTORS)
+        if cfilogs:
+            printrefdata(means[len(REFDATAPREDICTORS):], REFDATABTBPREDICTORS, 'RefDataBTB')
+    elif args.means:
+        printmeans(means, predictors)
+    else:
+        printtable(results, means, predictors)
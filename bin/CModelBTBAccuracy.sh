@@ -5,7 +5,7 @@
 ## Created: 23 October 2023
 ## Modified: 
 ##
-## Purpose: Takes a directory of branch outcomes organized as 1 files per benchmark.
+## Purpose: Takes a directory of cfi.logs, whole runs or 1 file per benchmark.
 ##          Computes the geometric mean for btb accuracy
 ##
 ## A component of the CORE-V-WALLY configurable RISC-V project.
@@ -31,28 +31,13 @@
 Directory="$1"
 Files="$1/*.log"
 
+# BranchSim.py replaces the external sim_bp, simulating Wally's BTB from the cfi.logs
+# written by the BPRED_LOGGER, and prints a "<predictor> <geometric mean>" line for
+# each BTB size.  The rate is the BTMR, counted as parseHPMC.py does.
+Predictors=""
 for Size in $(seq 6 2 16)
 do
-    Product=1.0
-    Count=0
-    BMDRArray=()
-    for File in $Files
-    do
-	lines=`sim_bp gshare 16 16 $Size 1  $File | tail -5`
-        Total=`echo "$lines" | head -1 | awk '{print $5}'`
-        Miss=`echo "$lines" | tail -2 | head -1 | awk '{print $8}'`
-        BMDR=`echo "100.0 * $Miss / $Total" | bc -l`
-        BMDRArray+=("$BMDR")
-        if [ $Miss -eq 0 ]; then
-	    Product=`echo "scale=200; $Product * 100 / $Total" | bc -l`
-        else
-            Product=`echo "scale=200; $Product * $BMDR" | bc -l`
-        fi
-	Count=$((Count+1))
-    done
-    # with such long precision bc outputs onto multiple lines
-    # must remove \n and \ from string
-    Product=`echo "$Product" | tr -d '\n' | tr -d '\\\'`
-    GeoMean=`perl -E "say $Product**(1/$Count)"`
-    echo "$Pred$Size $GeoMean"
+    Predictors="$Predictors btb:$Size"
 done
+
+BranchSim.py -f $Files -p $Predictors --countwarmup --means
@@ -31,37 +31,18 @@
 Directory="$1"
 Files="$1/*.log"
 
+# BranchSim.py replaces the external sim_bp and simulates every predictor in one run,
+# printing a "<predictor> <geometric mean>" line for each as before
+Predictors=""
 for Pred in "bimodal" "gshare" "local4" "local8" "local10"
 do
     for Size in $(seq 6 2 16)
     do
-	if [ $Pred = "gshare" ]; then
-	    SizeString="$Size $Size 18 1"
-	elif [ $Pred = "bimodal" ]; then
-	    SizeString="$Size 18 1"
-	elif [ $Pred = "local4" ]; then
-	    SizeString="$Size 4 18 1"
-	    Pred="yehpatt"
-	elif [ $Pred = "local8" ]; then
-	    SizeString="$Size 8 18 1"
-	    Pred="yehpatt"
-	elif [ $Pred = "local10" ]; then
-	    SizeString="$Size 10 18 1"
-	    Pred="yehpatt"
-	fi
-
-	Product=1.0
-	Count=0
-	for File in $Files
-	do
-	    #echo "sim_bp $Pred $Size $Size 18 1 $File | tail -1 | awk '{print $4}'"
-	    #echo "sim_bp $Pred $SizeString $File | tail -1 | awk '{print $4}'"
-	    BMDR=`sim_bp -c $Pred $SizeString $File | tail -1 | awk '{print $4}'`
-	    Product=`echo "$Product * $BMDR" | bc`
-	    Count=$((Count+1))
-	done
-
-	GeoMean=`perl -E "say $Product**(1/$Count)"`
-	echo "$Pred$Size $GeoMean"
+	case $Pred in
+	    local*) Predictors="$Predictors local:$Size:${Pred#local}" ;;
+	    *)      Predictors="$Predictors $Pred:$Size" ;;
+	esac
     done
 done
+
+BranchSim.py -f $Files -p $Predictors --countwarmup --means
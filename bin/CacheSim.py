@@ -37,20 +37,56 @@
 # This helps avoid unexpected logger behavior.
 # With verbose mode off, the simulator only reports mismatches between its and Wally's behavior.
 # With verbose mode on, the simulator logs each access into the cache.
-# Add -p or --perf to report the hit/miss ratio. 
+# Add -p or --perf to report the hit/miss ratio, with the misses of each test split
+# into compulsory, capacity and conflict misses.
 # Add -d or --dist to report the distribution of loads, stores, and atomic ops.
 # These distributions may not add up to 100; this is because of flushes or invalidations.
+# Add -s or --sweep to evaluate several geometries (sets:ways:linebytes) from one read
+# of the log and print a hit/miss/writeback table.
+# Add --policy <plru|lru|fifo|random|srrip|brrip> to change the replacement policy.
+# Wally uses plru, so expect mismatches with the others; use -p to compare hit rates.
+# With --sweep, lru uses stack-distance analysis to cover every associativity in one
+# pass; the other policies simulate each geometry in turn.
+# Add -H or --hierarchy to count line fills, writebacks and ebu/DDR bytes per test.
+# The -f log is treated as the D$; --ifile <I$ log> adds the I$ from the same run,
+# --victims N a shared victim buffer, and --l2 <sets:ways:linebytes> a shared L2.
+# Add --hotspots N to list the N cache lines and 4 KiB pages with the most misses as CSV
+# (or JSON with --hotspotfile <name>.json); --symbols <elf or objdump> names them.
+# Add --prefetch <nextline|stride|stream> to also run the log with a prefetcher and report
+# issued, useful, late and unused prefetches and the misses caused by cache pollution.
+# Add -j N or --jobs N to simulate the sets in N worker processes.
+# Add --snapshot ROW (repeatable) to save the cache state after ROW rows of the log to
+# <log>.<ROW>.snap (or --snapshotprefix <prefix>.<ROW>.snap), and --resume <snap file>
+# to continue the same log from a snapshot without replaying the rows before it;
+# -p then reports hits and misses for the whole log, without the three-C split of
+# the misses. The geometry may be omitted.
+# Add -c <bin file> or --convert <bin file> to save the log as a binary trace, which
+# is memory mapped instead of parsed when later given to -f. The geometry may be omitted.
+# The whole log is loaded into NumPy columns up front, so NumPy must be installed.
 
 import sys
 import math
 import argparse
 import os
+import collections
+import bisect
+import csv
+import json
+import re
+import multiprocessing
+import mmap
+import struct
+import gzip
+import pickle
+from array import array
+
+import numpy as np
 
 class CacheLine:
-    def __init__(self):
-        self.tag = 0
-        self.valid = False
-        self.dirty = False
+    def __init__(self, tag=0, valid=False, dirty=False):
+        self.tag = tag
+        self.valid = valid
+        self.dirty = dirty
     
     def __str__(self):
         string = "(V: " + str(self.valid) + ", D: " + str(self.dirty)
@@ -60,8 +96,192 @@ class CacheLine:
     def __repr__(self):
         return self.__str__()
 
+# Replacement policies.  Each one keeps its per-set state in flat
+# arrays and is driven by the cache through four calls:
+#   touch(setnum, waynum)  a hit on the given way
+#   fill(setnum, waynum)   a new line was written into the given way
+#   victim(setnum)         the way to evict from a full set
+#   clear()                forget all history (a new test is starting)
+
+# tree pseudo-LRU, as implemented by Wally's cacheLRU.
+# each set's tree is packed into one integer, bit i holds node i.
+class PLRUPolicy:
+    def __init__(self, numsets, numways, seed=0):
+        self.numsets = numsets
+        self.numways = numways
+        self.build_tables()
+        self.clear()
+
+    # precomputes, for each way, which tree bits an access to it
+    # touches and the values they take, plus a lookup table from
+    # packed tree to victim way for the common small associativities
+    def build_tables(self):
+        self.keep = []
+        self.set = []
+        bottomrow = (self.numways - 1)//2
+        for waynum in range(self.numways):
+            touched = 0
+            value = 0
+            if self.numways > 1:
+                index = (waynum // 2) + bottomrow
+                touched |= 1 << index
+                value |= int(not (waynum % 2)) << index
+                while index > 0:
+                    parent = (index-1) // 2
+                    touched |= 1 << parent
+                    value |= (index % 2) << parent
+                    index = parent
+            self.keep.append(~touched & ((1 << 64) - 1))
+            self.set.append(value)
+
+        self.victimtable = None
+        if 1 < self.numways <= 16:
+            self.victimtable = [self.walk(tree) for tree in range(1 << (self.numways-1))]
+
+    def clear(self):
+        self.trees = array('Q', bytes(8*self.numsets))
+
+    # updates the psuedo-LRU tree for the given set
+    # with an access to the given way
+    def touch(self, setnum, waynum):
+        self.trees[setnum] = (self.trees[setnum] & self.keep[waynum]) | self.set[waynum]
+
+    fill = touch
+
+    # walks a packed pLRU tree from the root to the victim way
+    def walk(self, tree):
+        index = 0
+        bottomrow = (self.numways - 1) // 2 #first index on the bottom row of the tree
+        while index < bottomrow:
+            if (tree >> index) & 1 == 0:
+                # Go to the left child
+                index = index*2 + 1
+            else:
+                # Go to the right child
+                index = index*2 + 2     
+        
+        return (index - bottomrow)*2 + ((tree >> index) & 1)
+
+    def victim(self, setnum):
+        if self.victimtable is not None:
+            return self.victimtable[self.trees[setnum]]
+        return self.walk(self.trees[setnum])
+
+    # returns the tree of the given set as a list of bits
+    def getbits(self, setnum):
+        return [(self.trees[setnum] >> i) & 1 for i in range(self.numways-1)]
+
+# true LRU.  Every line carries the time of its last use and the
+# victim is the line used longest ago.
+class LRUPolicy:
+    def __init__(self, numsets, numways, seed=0):
+        self.numsets = numsets
+        self.numways = numways
+        self.clear()
+
+    def clear(self):
+        self.stamps = array('Q', bytes(8*self.numsets*self.numways))
+        self.time = 0
+
+    def touch(self, setnum, waynum):
+        self.time += 1
+        self.stamps[setnum*self.numways + waynum] = self.time
+
+    fill = touch
+
+    def victim(self, setnum):
+        base = setnum*self.numways
+        stamps = self.stamps[base:base + self.numways]
+        return stamps.index(min(stamps))
+
+# first in, first out.  Lines carry the time they were filled and
+# hits do not change the order.
+class FIFOPolicy(LRUPolicy):
+    def touch(self, setnum, waynum):
+        pass
+
+    def fill(self, setnum, waynum):
+        LRUPolicy.touch(self, setnum, waynum)
+
+# uniformly random victims from a seeded splitmix64 generator in each
+# set, so runs repeat and the victims of a set do not depend on the
+# accesses to other sets
+class RandomPolicy:
+    MASK = (1 << 64) - 1
+
+    def __init__(self, numsets, numways, seed=0):
+        self.numsets = numsets
+        self.numways = numways
+        self.seed = seed
+        self.clear()
+
+    def clear(self):
+        self.states = array('Q', [((self.seed << 32) + setnum) & self.MASK for setnum in range(self.numsets)])
+
+    def touch(self, setnum, waynum):
+        pass
+
+    fill = touch
+
+    def victim(self, setnum):
+        state = (self.states[setnum] + 0x9e3779b97f4a7c15) & self.MASK
+        self.states[setnum] = state
+        z = ((state ^ (state >> 30)) * 0xbf58476d1ce4e5b9) & self.MASK
+        z = ((z ^ (z >> 27)) * 0x94d049bb133111eb) & self.MASK
+        return (z ^ (z >> 31)) % self.numways
+
+# static re-reference interval prediction (Jaleel et al., ISCA 2010)
+# with 2-bit re-reference prediction values.  Hits predict a near
+# re-reference, new lines a long one, and the victim is the first
+# line predicted distant after ageing the whole set.
+class SRRIPPolicy:
+    MAXRRPV = 3
+
+    def __init__(self, numsets, numways, seed=0):
+        self.numsets = numsets
+        self.numways = numways
+        self.clear()
+
+    def clear(self):
+        self.rrpv = bytearray([self.MAXRRPV])*(self.numsets*self.numways)
+
+    def touch(self, setnum, waynum):
+        self.rrpv[setnum*self.numways + waynum] = 0
+
+    def fill(self, setnum, waynum):
+        self.rrpv[setnum*self.numways + waynum] = self.MAXRRPV - 1
+
+    def victim(self, setnum):
+        base = setnum*self.numways
+        rrpv = self.rrpv[base:base + self.numways]
+        oldest = max(rrpv)
+        if oldest < self.MAXRRPV:
+            age = self.MAXRRPV - oldest
+            self.rrpv[base:base + self.numways] = bytes(value + age for value in rrpv)
+        return rrpv.index(oldest)
+
+# bimodal RRIP: like SRRIP, but new lines are predicted distant except
+# for one fill in every BIMODAL, which protects thrashing working sets.
+# Fills are counted per set, so sets do not interact.
+class BRRIPPolicy(SRRIPPolicy):
+    BIMODAL = 32
+
+    def clear(self):
+        SRRIPPolicy.clear(self)
+        self.fills = array('Q', bytes(8*self.numsets))
+
+    def fill(self, setnum, waynum):
+        self.fills[setnum] += 1
+        if self.fills[setnum] % self.BIMODAL == 0:
+            self.rrpv[setnum*self.numways + waynum] = self.MAXRRPV - 1
+        else:
+            self.rrpv[setnum*self.numways + waynum] = self.MAXRRPV
+
+POLICIES = {'plru': PLRUPolicy, 'lru': LRUPolicy, 'fifo': FIFOPolicy,
+            'random': RandomPolicy, 'srrip': SRRIPPolicy, 'brrip': BRRIPPolicy}
+
 class Cache:
-    def __init__(self, numsets, numways, addrlen, taglen):
+    def __init__(self, numsets, numways, addrlen, taglen, policy='plru', seed=0):
         self.numways = numways
         self.numsets = numsets
 
@@ -70,122 +290,143 @@ class Cache:
         self.setlen = int(math.log(numsets, 2))
         self.offsetlen = self.addrlen - self.taglen - self.setlen
 
-        self.ways = []
-        for i in range(numways):
-            self.ways.append([])
-            for j in range(numsets):
-                self.ways[i].append(CacheLine())
-        
-        self.pLRU = []
-        for i in range(self.numsets):
-            self.pLRU.append([0]*(self.numways-1))
+        # the address masks only depend on the geometry, so build them once
+        self.tagmask = (1 << self.taglen) - 1
+        self.setmask = (1 << self.setlen) - 1
+        self.offsetmask = (1 << self.offsetlen) - 1
+
+        # line state lives in flat arrays indexed by setnum*numways + waynum
+        # so that flushes and invalidations are a single block write.
+        self.numlines = numsets*numways
+        self.blank = bytes(self.numlines)
+        self.tags = array('Q', bytes(8*self.numlines))
+        self.valid = bytearray(self.numlines)
+        self.dirty = bytearray(self.numlines)
+
+        self.policyname = policy
+        self.policy = POLICIES[policy](numsets, numways, seed)
     
     # flushes the cache by setting all dirty bits to False
     def flush(self):
-        for way in self.ways:
-            for line in way:
-                line.dirty = False
+        self.dirty[:] = self.blank
     
     # invalidates the cache by setting all valid bits to False
     def invalidate(self):
-        for way in self.ways:
-            for line in way:
-                line.valid = False
+        self.valid[:] = self.blank
     
-    # resets the pLRU to a fresh 2-D array of 0s
+    # resets the replacement state (the pLRU trees by default)
     def clear_pLRU(self):
-        self.pLRU = []
-        for i in range(self.numsets):
-            self.pLRU.append([0]*(self.numways-1))
+        self.policy.clear()
     
     # splits the given address into tag, set, and offset
     def splitaddr(self, addr):
         # no need for offset in the sim, but it's here for debug
-        tag = addr >> (self.setlen + self.offsetlen) & int('1'*self.taglen, 2)
-        setnum = (addr >> self.offsetlen) & int('1'*self.setlen, 2)
-        offset = addr & int('1'*self.offsetlen, 2)
+        tag = addr >> (self.setlen + self.offsetlen) & self.tagmask
+        setnum = (addr >> self.offsetlen) & self.setmask
+        offset = addr & self.offsetmask
         return tag, setnum, offset
     
+    # splits a NumPy array of addresses into arrays of tags and sets
+    def splittrace(self, addrs):
+        tags = (addrs >> (self.setlen + self.offsetlen)) & self.tagmask
+        sets = (addrs >> self.offsetlen) & self.setmask
+        return tags, sets
+
     # performs a cache access with the given address.
     # returns a character representing the outcome:
     # H/M/E/D - hit, miss, eviction, or eviction with writeback
     def cacheaccess(self, addr, write=False):
         tag, setnum, _ = self.splitaddr(addr)
+        return self.setaccess(tag, setnum, write)
+
+    # performs a cache access with an already split address.
+    # this is the entry point used when a whole trace has been
+    # split up front by splittrace.
+    def setaccess(self, tag, setnum, write=False):
+        base = setnum*self.numways
+        tags = self.tags
+        valid = self.valid
 
         # check our ways to see if we have a hit
-        for waynum in range(self.numways):
-            line = self.ways[waynum][setnum]
-            if line.tag == tag and line.valid:
-                line.dirty = line.dirty or write
-                self.update_pLRU(waynum, setnum)
+        for line in range(base, base + self.numways):
+            if tags[line] == tag and valid[line]:
+                if write:
+                    self.dirty[line] = 1
+                self.policy.touch(setnum, line - base)
                 return 'H'
 
         # we didn't hit, but we may not need to evict.
         # check for an empty way line.
-        for waynum in range(self.numways):
-            line = self.ways[waynum][setnum]
-            if not line.valid:
-                line.tag = tag
-                line.valid = True
-                line.dirty = write
-                self.update_pLRU(waynum, setnum)
-                return 'M'
+        line = valid.find(0, base, base + self.numways)
+        if line >= 0:
+            tags[line] = tag
+            valid[line] = 1
+            self.dirty[line] = write
+            self.policy.fill(setnum, line - base)
+            return 'M'
         
         # we need to evict. Select a victim and overwrite.
         victim = self.getvictimway(setnum)
-        line = self.ways[victim][setnum]
-        prevdirty = line.dirty
-        line.tag = tag
-        line.valid = True   # technically redundant
-        line.dirty = write
-        self.update_pLRU(victim, setnum)
+        line = base + victim
+        prevdirty = self.dirty[line]
+        self.evictedtag = tags[line]
+        tags[line] = tag
+        self.dirty[line] = write
+        self.policy.fill(setnum, victim)
         return 'D' if prevdirty else 'E'
 
-    # updates the psuedo-LRU tree for the given set
+    # updates the replacement state of the given set
     # with an access to the given way
     def update_pLRU(self, waynum, setnum):
-        if self.numways == 1:
-            return
-        
-        tree = self.pLRU[setnum]
-        bottomrow = (self.numways - 1)//2
-        index = (waynum // 2) + bottomrow
-        tree[index] = int(not (waynum % 2))
-        while index > 0:
-            parent = (index-1) // 2
-            tree[parent] = index % 2 
-            index = parent
-
-    # uses the psuedo-LRU tree to select
-    # a victim way from the given set
+        self.policy.touch(setnum, waynum)
+
+    # asks the replacement policy for a victim way
+    # from the given set
     # returns the victim way as an integer
     def getvictimway(self, setnum):
         if self.numways == 1:
             return 0
-        
-        tree = self.pLRU[setnum]
-        index = 0
-        bottomrow = (self.numways - 1) // 2 #first index on the bottom row of the tree
-        while index < bottomrow:
-            if tree[index] == 0:
-                # Go to the left child
-                index = index*2 + 1
-            else: #tree[index] == 1
-                # Go to the right child
-                index = index*2 + 2     
-        
-        victim = (index - bottomrow)*2
-        if tree[index] == 1:
-            victim += 1
-        
-        return victim
+        return self.policy.victim(setnum)
+
+    # reports whether a line is resident without touching any state
+    def probe(self, tag, setnum):
+        base = setnum*self.numways
+        for line in range(base, base + self.numways):
+            if self.tags[line] == tag and self.valid[line]:
+                return True
+        return False
+
+    # rebuilds the address of the first byte of a line from its tag and set
+    def joinaddr(self, tag, setnum):
+        return (tag << (self.setlen + self.offsetlen)) | (setnum << self.offsetlen)
+
+    # marks a resident line dirty, as when a dirty line returns from a victim buffer
+    def markdirty(self, tag, setnum):
+        base = setnum*self.numways
+        for line in range(base, base + self.numways):
+            if self.tags[line] == tag and self.valid[line]:
+                self.dirty[line] = 1
+
+    # returns the addresses of every valid dirty line
+    def dirtylines(self):
+        lines = np.flatnonzero(np.frombuffer(self.valid, dtype=np.uint8) & np.frombuffer(self.dirty, dtype=np.uint8))
+        return [self.joinaddr(self.tags[line], line // self.numways) for line in lines.tolist()]
+
+    # returns the state of one line, for debug and testing
+    def getline(self, waynum, setnum):
+        line = setnum*self.numways + waynum
+        return CacheLine(self.tags[line], bool(self.valid[line]), bool(self.dirty[line]))
+
+    # returns the pLRU tree of the given set as a list of bits
+    def getpLRU(self, setnum):
+        return self.policy.getbits(setnum)
     
     def __str__(self):
         string = ""
         for i in range(self.numways):
             string += "Way " + str(i) + ": "
-            for line in self.ways[i]:
-                string += str(line) + ", "
+            for j in range(self.numsets):
+                string += str(self.getline(i, j)) + ", "
             string += "\n\n"
         return string
 
@@ -193,92 +434,1170 @@ class Cache:
         return self.__str__()
     
 
+# simulates one shard of a trace in a worker process.  The cache
+# arrives pickled, so each worker starts from its own copy.
+def simulateshard(shard):
+    (cache, addr, op) = shard
+    return simulate(cache, CacheTrace(addr, op, None, {}))
+
+# simulates a trace on several cores.  Sets never interact, so rows are
+# dealt out by set index modulo jobs and each shard is run on its own
+# copy of the cache.  Flushes, invalidations and test markers are sent
+# to every shard.  The per-shard outcomes are merged back into trace
+# order.  Every policy keeps its replacement state per set (LRU and
+# FIFO compare stamps only within a set), so the result matches
+# simulate().  The state of cache itself is left untouched.
+def simulatesharded(cache, trace, jobs):
+    jobs = min(jobs, cache.numsets)
+    _, sets = cache.splittrace(trace.addr)
+    isaccess = (trace.op == ord('R')) | (trace.op == ord('W')) | (trace.op == ord('A'))
+    shardof = sets % jobs
+    shardrows = [np.flatnonzero(~isaccess | (shardof == shard)) for shard in range(jobs)]
+    shards = [(cache, trace.addr[rows], trace.op[rows]) for rows in shardrows]
+
+    results = np.full(len(trace), ord('X'), dtype=np.uint8)
+    with multiprocessing.Pool(processes=jobs) as pool:
+        for rows, shardresults in zip(shardrows, pool.imap(simulateshard, shards)):
+            accessrows = isaccess[rows]
+            results[rows[accessrows]] = shardresults[accessrows]
+    return results
+
+# the cache geometries of the way_* derivative configurations in
+# config/derivlist.txt, as (sets, ways, line length in bytes)
+DERIVGEOMETRIES = [(64, 1, 64), (64, 2, 64), (64, 4, 64), (64, 8, 64),
+                   (32, 4, 64), (128, 4, 32), (32, 4, 128)]
+
+# true LRU caches with the same number of sets and line length,
+# evaluated together with Mattson stack-distance analysis.  Each set
+# keeps one recency stack as deep as the largest associativity; an
+# access at stack distance d hits in every cache with more than d ways.
+# Dirty bits are kept per associativity as a bit mask on each entry so
+# that writebacks are counted when a line is pushed out of a cache.
+class LRUStack:
+    def __init__(self, numsets, waylist, addrlen, offsetlen):
+        self.waylist = sorted(waylist)
+        self.depth = self.waylist[-1]
+        self.alldirty = (1 << len(self.waylist)) - 1
+        self.numsets = numsets
+        setlen = int(math.log(numsets, 2))
+        self.splitter = Cache(numsets, 1, addrlen, addrlen - setlen - offsetlen)
+        self.invalidate()
+
+    def splittrace(self, addrs):
+        return self.splitter.splittrace(addrs)
+
+    # returns the outcome (H/M/E/D) for each associativity in waylist
+    def setaccess(self, tag, setnum, write=False):
+        tags = self.tags[setnum]
+        dirty = self.dirty[setnum]
+        try:
+            distance = tags.index(tag)
+        except ValueError:
+            distance = self.depth
+        results = []
+        keep = 0
+        for k, ways in enumerate(self.waylist):
+            if distance < ways:
+                results.append('H')
+                keep |= 1 << k
+            elif len(tags) < ways:
+                results.append('M')
+            elif dirty[ways-1] & (1 << k):
+                # the line at depth ways-1 is pushed out of this cache
+                dirty[ways-1] &= ~(1 << k)
+                results.append('D')
+            else:
+                results.append('E')
+
+        if distance < len(tags):
+            tags.pop(distance)
+            linedirty = dirty.pop(distance) & keep
+        else:
+            linedirty = 0
+            if len(tags) == self.depth:
+                tags.pop()
+                dirty.pop()
+        tags.insert(0, tag)
+        dirty.insert(0, self.alldirty if write else linedirty)
+        return results
+
+    def flush(self):
+        for dirty in self.dirty:
+            dirty[:] = [0]*len(dirty)
+
+    def invalidate(self):
+        self.tags = [[] for i in range(self.numsets)]
+        self.dirty = [[] for i in range(self.numsets)]
+
+    def clear_pLRU(self):
+        pass
+
+# parses a geometry written as sets:ways:linebytes
+def parsegeometry(text):
+    sets, ways, linebytes = (int(field) for field in text.split(':'))
+    return (sets, ways, linebytes)
+
+# evaluates every (sets, ways, line bytes) geometry of a decoded trace.
+# Only true LRU is swept in a single pass: geometries that share sets and
+# line length share one LRUStack.  The other policies have no state that
+# geometries could share, so each geometry is its own simulate() run over
+# the same decoded trace.  Returns a dictionary from geometry to a
+# dictionary of H/M/E/D counts.
+def sweep(trace, geometries, addrlen, policy='plru', seed=0):
+    if policy != 'lru':
+        isaccess = (trace.op == ord('R')) | (trace.op == ord('W')) | (trace.op == ord('A'))
+        results = {}
+        for geometry in geometries:
+            (sets, ways, linebytes) = geometry
+            cache = Cache(sets, ways, addrlen, addrlen - int(math.log(sets*linebytes, 2)), policy, seed)
+            outcomes = simulate(cache, trace)[isaccess]
+            results[geometry] = {result: int(np.count_nonzero(outcomes == ord(result))) for result in 'HMED'}
+        return results
+
+    shapes = {}
+    for (sets, ways, linebytes) in geometries:
+        shapes.setdefault((sets, linebytes), set()).add(ways)
+
+    models = []
+    splits = []
+    tallies = []
+    for (sets, linebytes), waylist in shapes.items():
+        model = LRUStack(sets, waylist, addrlen, int(math.log(linebytes, 2)))
+        tags, setnums = model.splittrace(trace.addr)
+        models.append(model)
+        splits.append((tags.tolist(), setnums.tolist()))
+        tallies.append([dict.fromkeys('HMED', 0) for ways in model.waylist])
+
+    for row, op in enumerate(trace.op.tolist()):
+        if op == 82 or op == 87 or op == 65: # 'R', 'W', 'A'
+            write = op != 82
+            for model, (tags, setnums), counts in zip(models, splits, tallies):
+                for count, result in zip(counts, model.setaccess(tags[row], setnums[row], write)):
+                    count[result] += 1
+        elif op == 70: # 'F'
+            for model in models:
+                model.flush()
+        elif op == 73: # 'I'
+            for model in models:
+                model.invalidate()
+        elif op == 66 or op == 84: # 'B', 'T'
+            for model in models:
+                model.invalidate()
+                model.clear_pLRU()
+
+    results = {}
+    for ((sets, linebytes), waylist), model, counts in zip(shapes.items(), models, tallies):
+        for ways, count in zip(model.waylist, counts):
+            results[(sets, ways, linebytes)] = count
+    return results
+
+# prints the hit/miss/writeback table produced by sweep
+def printsweep(results, geometries):
+    print("%6s %5s %5s %8s %10s %10s %10s %10s %9s" % ("sets", "ways", "line", "bytes", "accesses", "hits", "misses", "writebacks", "missrate"))
+    for geometry in geometries:
+        (sets, ways, linebytes) = geometry
+        count = results[geometry]
+        misses = count['M'] + count['E'] + count['D']
+        accesses = count['H'] + misses
+        missrate = 100.0*misses/accesses if accesses else 0.0
+        print("%6d %5d %5d %8d %10d %10d %10d %10d %8.3f%%" % (sets, ways, linebytes, sets*ways*linebytes,
+                                                              accesses, count['H'], misses, count['D'], missrate))
+
+# a small fully associative buffer holding lines evicted from the L1s,
+# kept in LRU order.  A line found here on an L1 miss goes back to the
+# L1 without a bus transfer.
+class VictimBuffer:
+    def __init__(self, entries):
+        self.entries = entries
+        self.lines = collections.OrderedDict()
+
+    # removes and returns (found, dirty) for a line address
+    def take(self, addr):
+        if addr in self.lines:
+            return True, self.lines.pop(addr)
+        return False, False
+
+    # inserts an evicted line; returns the address of a dirty line
+    # that had to leave the buffer to make room, or None
+    def put(self, addr, dirty):
+        self.lines[addr] = dirty
+        if len(self.lines) > self.entries:
+            spilled, spilleddirty = self.lines.popitem(last=False)
+            if spilleddirty:
+                return spilled
+        return None
+
+    # cleans the buffer and returns the addresses that needed a writeback
+    def flush(self):
+        written = [addr for addr, dirty in self.lines.items() if dirty]
+        for addr in written:
+            self.lines[addr] = False
+        return written
+
+    def invalidate(self):
+        self.lines.clear()
+
+# the counters kept for each test segment by Hierarchy
+HIERARCHYCOUNTERS = ['IFills', 'DFills', 'DWritebacks', 'VictimHits', 'EBUBytes',
+                     'L2Hits', 'L2Misses', 'L2Writebacks', 'DDRBytes']
+
+# chains the I$ and D$ into an optional shared victim buffer, the ebu
+# (the AHB interface shared by the IFU and LSU) and an optional shared
+# L2 in front of DDR.  Every line moved across the ebu or to DDR is
+# counted; uncached accesses never appear in the cache logs and are
+# not modelled.
+class Hierarchy:
+    def __init__(self, l1s, victims=0, l2=None):
+        self.l1s = l1s # (name, Cache) pairs, name is 'I' or 'D'
+        self.victimbuffer = VictimBuffer(victims) if victims else None
+        self.l2 = l2
+        self.counts = dict.fromkeys(HIERARCHYCOUNTERS, 0)
+
+    # a line moves from the next level into an L1
+    def busread(self, addr, linebytes):
+        self.counts['EBUBytes'] += linebytes
+        self.nextlevel(addr, False, linebytes)
+
+    # a dirty line moves from an L1 or the victim buffer to the next level
+    def buswrite(self, addr, linebytes):
+        self.counts['EBUBytes'] += linebytes
+        self.nextlevel(addr, True, linebytes)
+
+    def nextlevel(self, addr, write, linebytes):
+        if self.l2 is None:
+            self.counts['DDRBytes'] += linebytes
+            return
+        result = self.l2.cacheaccess(addr, write)
+        l2linebytes = 1 << self.l2.offsetlen
+        if result == 'H':
+            self.counts['L2Hits'] += 1
+            return
+        self.counts['L2Misses'] += 1
+        self.counts['DDRBytes'] += l2linebytes
+        if result == 'D':
+            self.counts['L2Writebacks'] += 1
+            self.counts['DDRBytes'] += l2linebytes
+
+    def access(self, level, tag, setnum, write):
+        name, cache = self.l1s[level]
+        result = cache.setaccess(tag, setnum, write)
+        if result == 'H':
+            return
+        linebytes = 1 << cache.offsetlen
+        self.counts[name + 'Fills'] += 1
+        found, dirty = False, False
+        if self.victimbuffer is not None:
+            found, dirty = self.victimbuffer.take(cache.joinaddr(tag, setnum))
+        if found:
+            self.counts['VictimHits'] += 1
+            if dirty:
+                cache.markdirty(tag, setnum)
+        else:
+            self.busread(cache.joinaddr(tag, setnum), linebytes)
+
+        if result == 'M':
+            return
+        evicted = cache.joinaddr(cache.evictedtag, setnum)
+        if self.victimbuffer is not None:
+            evicted = self.victimbuffer.put(evicted, result == 'D')
+            if evicted is not None:
+                self.writeback(name, evicted, linebytes)
+        elif result == 'D':
+            self.writeback(name, evicted, linebytes)
+
+    def writeback(self, name, addr, linebytes):
+        if name == 'D':
+            self.counts['DWritebacks'] += 1
+        self.buswrite(addr, linebytes)
+
+    # a D$ flush writes every dirty line back, including those in the victim buffer
+    def flush(self, level):
+        name, cache = self.l1s[level]
+        linebytes = 1 << cache.offsetlen
+        written = cache.dirtylines()
+        if self.victimbuffer is not None:
+            written += self.victimbuffer.flush()
+        for addr in written:
+            self.writeback(name, addr, linebytes)
+        cache.flush()
+
+    def invalidate(self, level):
+        self.l1s[level][1].invalidate()
+
+    # a new test is starting, so every level starts empty
+    def reset(self, level):
+        cache = self.l1s[level][1]
+        cache.invalidate()
+        cache.clear_pLRU()
+        if self.victimbuffer is not None:
+            self.victimbuffer.invalidate()
+        if self.l2 is not None:
+            self.l2.invalidate()
+            self.l2.clear_pLRU()
+
+# merges the rows of several traces recorded by the loggers in the same
+# simulation.  The logs carry no timestamps, but they all write their
+# BEGIN/TRAIN/END markers at the same events, so the k-th segment of each
+# log lines up.  Within a segment the rows are interleaved in proportion
+# to their position.  Returns (trace number, row) pairs in merged order.
+def interleave(traces):
+    sources, rows, segments, positions = [], [], [], []
+    for source, trace in enumerate(traces):
+        ismarker = (trace.op == ord('B')) | (trace.op == ord('T')) | (trace.op == ord('E'))
+        segment = np.cumsum(ismarker)
+        segmentstart = np.flatnonzero(np.concatenate(([True], segment[1:] != segment[:-1])))
+        segmentlen = np.diff(np.append(segmentstart, len(trace)))
+        index = segment - segment[0]
+        position = (np.arange(len(trace)) - segmentstart[index]) / segmentlen[index]
+        position[ismarker] = -1.0
+        sources.append(np.full(len(trace), source))
+        rows.append(np.arange(len(trace)))
+        segments.append(segment)
+        positions.append(position)
+    sources, rows = np.concatenate(sources), np.concatenate(rows)
+    order = np.lexsort((sources, np.concatenate(positions), np.concatenate(segments)))
+    return list(zip(sources[order].tolist(), rows[order].tolist()))
+
+# runs the I$ and/or D$ traces through a Hierarchy.  traces and the
+# hierarchy's l1s are in the same order.  Returns a list of
+# (segment name, counters) with one entry per test segment, named
+# by the BEGIN or TRAIN marker that starts it.
+def simulatehierarchy(hierarchy, traces):
+    splits = []
+    for (name, cache), trace in zip(hierarchy.l1s, traces):
+        tags, sets = cache.splittrace(trace.addr)
+        splits.append((trace.op.tolist(), tags.tolist(), sets.tolist(), trace.labels))
+
+    segments = [('(start)', hierarchy.counts)]
+    for level, row in interleave(traces):
+        (ops, tags, sets, labels) = splits[level]
+        op = ops[row]
+        if op == 82 or op == 87 or op == 65: # 'R', 'W', 'A'
+            hierarchy.access(level, tags[row], sets[row], op != 82)
+        elif op == 70: # 'F'
+            hierarchy.flush(level)
+        elif op == 73: # 'I'
+            hierarchy.invalidate(level)
+        elif op == 66 or op == 84: # 'B', 'T'
+            if level == 0:
+                hierarchy.counts = dict.fromkeys(HIERARCHYCOUNTERS, 0)
+                segments.append((labels[row], hierarchy.counts))
+            hierarchy.reset(level)
+    return [(name, counts) for (name, counts) in segments if any(counts.values())]
+
+# the counters kept for each test segment by classifymisses
+MISSCLASSES = ['Accesses', 'Hits', 'Compulsory', 'Capacity', 'Conflict']
+
+# splits the misses of a simulated trace into the three Cs.  A miss to
+# a line not touched since the cache was last emptied is compulsory.
+# Otherwise it is a capacity miss if a fully associative LRU cache of
+# the same capacity would also have missed, and a conflict miss if
+# not.  The shadow cache is an ordered hash map in recency order.
+# Returns a list of (segment name, counters) like simulatehierarchy.
+def classifymisses(cache, trace, results):
+    lines = (trace.addr >> cache.offsetlen).tolist()
+    capacity = cache.numsets*cache.numways
+    touched = set()
+    shadow = collections.OrderedDict()
+    counts = dict.fromkeys(MISSCLASSES, 0)
+    segments = [('(start)', counts)]
+    for row, (op, result) in enumerate(zip(trace.op.tolist(), results.tolist())):
+        if op == 82 or op == 87 or op == 65: # 'R', 'W', 'A'
+            line = lines[row]
+            counts['Accesses'] += 1
+            inshadow = line in shadow
+            if inshadow:
+                shadow.move_to_end(line)
+            else:
+                shadow[line] = True
+                if len(shadow) > capacity:
+                    shadow.popitem(last=False)
+            if result == 72: # 'H'
+                counts['Hits'] += 1
+            elif line not in touched:
+                counts['Compulsory'] += 1
+            elif not inshadow:
+                counts['Capacity'] += 1
+            else:
+                counts['Conflict'] += 1
+            touched.add(line)
+        elif op == 73 or op == 66 or op == 84: # 'I', 'B', 'T'
+            # an emptied cache has to warm up again
+            touched.clear()
+            shadow.clear()
+            if op != 73:
+                counts = dict.fromkeys(MISSCLASSES, 0)
+                segments.append((trace.labels[row], counts))
+    return [(name, counts) for (name, counts) in segments if any(counts.values())]
+
+# reads the function and data symbols of a RISC-V ELF file.
+# returns a list of (address, name) pairs.
+def readelfsymbols(data):
+    is64 = data[4] == 2
+    if is64:
+        (shoff,) = struct.unpack_from('<Q', data, 0x28)
+        (shentsize, shnum) = struct.unpack_from('<HH', data, 0x3A)
+        sectionformat = '<IIQQQQIIQQ'
+    else:
+        (shoff,) = struct.unpack_from('<I', data, 0x20)
+        (shentsize, shnum) = struct.unpack_from('<HH', data, 0x2E)
+        sectionformat = '<IIIIIIIIII'
+    sections = [struct.unpack_from(sectionformat, data, shoff + i*shentsize) for i in range(shnum)]
+
+    symbols = []
+    for (name, sectiontype, flags, addr, offset, size, link, info, align, entsize) in sections:
+        if sectiontype != 2: # SHT_SYMTAB
+            continue
+        stroffset = sections[link][4]
+        for entry in range(offset, offset + size, entsize):
+            if is64:
+                (stname, stinfo, stother, shndx, value, stsize) = struct.unpack_from('<IBBHQQ', data, entry)
+            else:
+                (stname, value, stsize, stinfo, stother, shndx) = struct.unpack_from('<IIIBBH', data, entry)
+            if stinfo & 0xf in (1, 2) and value != 0: # STT_OBJECT, STT_FUNC
+                end = data.index(b'\0', stroffset + stname)
+                symbols.append((value, data[stroffset + stname:end].decode(errors='replace')))
+    return symbols
+
+# reads the symbols of an ELF file or of an objdump disassembly
+# (lines such as '0000000080000000 <_start>:').  Returns a sorted
+# list of addresses and a matching list of names.
+def loadsymbols(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] == b'\x7fELF':
+        symbols = readelfsymbols(data)
+    else:
+        label = re.compile(rb'^([0-9a-fA-F]+) <([^>]+)>:', re.MULTILINE)
+        symbols = [(int(addr, 16), name.decode(errors='replace')) for addr, name in label.findall(data)]
+    symbols.sort()
+    return [addr for addr, name in symbols], [name for addr, name in symbols]
+
+# names the symbol containing an address as symbol+offset
+def symbolof(symbols, addr):
+    (addrs, names) = symbols
+    index = bisect.bisect_right(addrs, addr) - 1
+    if index < 0:
+        return ''
+    return "%s+0x%x" % (names[index], addr - addrs[index])
+
+# the regions that misses are attributed to: cache lines and 4 KiB pages
+HOTSPOTPAGEBITS = 12
+
+# finds the cache lines and pages with the most misses.  Accesses are
+# grouped by line and by page with np.unique, and the misses and
+# writebacks (charged to the access whose miss evicted the dirty line)
+# are accumulated per group.  For an I$ log the addresses are PCs; the
+# D$ log only records data addresses.  Returns a list of dictionaries,
+# the top entries for lines followed by the top entries for pages.
+def hotspots(cache, trace, results, top, symbols=None):
+    isaccess = (trace.op == ord('R')) | (trace.op == ord('W')) | (trace.op == ord('A'))
+    addrs = trace.addr[isaccess]
+    missed = results[isaccess] != ord('H')
+    writeback = results[isaccess] == ord('D')
+
+    report = []
+    for kind, shift in (('line', cache.offsetlen), ('page', HOTSPOTPAGEBITS)):
+        regions, group = np.unique(addrs >> shift, return_inverse=True)
+        accesses = np.bincount(group)
+        misses = np.bincount(group, weights=missed).astype(np.int64)
+        writebacks = np.bincount(group, weights=writeback).astype(np.int64)
+        for index in np.lexsort((-writebacks, -misses))[:top].tolist():
+            if misses[index] == 0 and writebacks[index] == 0:
+                break
+            addr = int(regions[index]) << shift
+            report.append({'kind': kind, 'address': "%x" % addr, 'accesses': int(accesses[index]),
+                           'misses': int(misses[index]), 'writebacks': int(writebacks[index]),
+                           'symbol': symbolof(symbols, addr) if symbols else ''})
+    return report
+
+# writes a hot-spot report as JSON if the file name ends in .json and as CSV
+# otherwise; with no file name the CSV goes to stdout
+def writehotspots(report, path=None):
+    fields = ['kind', 'address', 'accesses', 'misses', 'writebacks', 'symbol']
+    if path and path.endswith('.json'):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        return
+    f = open(path, 'w', newline='') if path else sys.stdout
+    writer = csv.DictWriter(f, fieldnames=fields)
+    writer.writeheader()
+    writer.writerows(report)
+    if path:
+        f.close()
+
+# prints a table with one row of counters per test segment
+def printsegments(segments, counters):
+    total = dict.fromkeys(counters, 0)
+    print("%-40s" % "segment" + "".join("%13s" % counter for counter in counters))
+    for (name, counts) in segments + [('Total', total)]:
+        print("%-40s" % name[-40:] + "".join("%13d" % counts[counter] for counter in counters))
+        for counter in counters:
+            total[counter] += counts[counter]
+
+# Prefetchers.  Each one is trained on every demand access with
+#   train(line, key, missed, firstuse)
+# where line is the line number (address >> offset bits), key groups
+# related accesses, missed is True for a demand miss and firstuse is
+# True for the first demand hit on a prefetched line.  train returns
+# the line numbers to prefetch.  The cache logs do not record the PC
+# of loads and stores, so accesses are keyed by their 4 KiB page.
+# discarded counts prefetched lines a prefetcher dropped itself.
+
+# tagged next-line prefetching: a miss, or the first use of a
+# prefetched line, fetches the following degree lines
+class NextLinePrefetcher:
+    buffered = False
+    discarded = 0
+
+    def __init__(self, degree):
+        self.degree = degree
+
+    def train(self, line, key, missed, firstuse):
+        if missed or firstuse:
+            return [line + i for i in range(1, self.degree + 1)]
+        return []
+
+    def clear(self):
+        pass
+
+# a reference prediction table: each key remembers its last line and
+# stride, and once the same non-zero stride is seen twice in a row the
+# next degree lines along the stride are fetched
+class StridePrefetcher:
+    buffered = False
+    discarded = 0
+    ENTRIES = 64
+
+    def __init__(self, degree):
+        self.degree = degree
+        self.clear()
+
+    def train(self, line, key, missed, firstuse):
+        (lastline, stride, confidence) = self.table.pop(key, (line, 0, 0))
+        if line == lastline:
+            # another access to the same line says nothing about the stride
+            self.table[key] = (lastline, stride, confidence)
+            return []
+        if line - lastline == stride:
+            confidence = min(confidence + 1, 3)
+        else:
+            stride = line - lastline
+            confidence = 0
+        self.table[key] = (line, stride, confidence)
+        if len(self.table) > self.ENTRIES:
+            self.table.popitem(last=False)
+        if confidence >= 1:
+            return [line + stride*i for i in range(1, self.degree + 1)]
+        return []
+
+    def clear(self):
+        self.table = collections.OrderedDict()
+
+# Jouppi stream buffers: prefetched lines wait in one of a few FIFOs
+# instead of the cache, so they cannot pollute it.  A miss that finds
+# its line in a buffer takes it and the buffer fetches one more line;
+# a miss found nowhere restarts the least recently used buffer.
+class StreamBufferPrefetcher:
+    buffered = True
+    STREAMS = 4
+
+    def __init__(self, degree):
+        self.degree = degree
+        self.discarded = 0
+        self.clear()
+
+    # removes a line from whichever buffer holds it
+    def take(self, line):
+        for stream in self.streams:
+            if line in stream:
+                while stream[0] != line:
+                    stream.popleft()
+                    self.discarded += 1
+                stream.popleft()
+                self.streams.remove(stream)
+                self.streams.append(stream)
+                self.taken = stream
+                return True
+        self.taken = None
+        return False
+
+    def train(self, line, key, missed, firstuse):
+        if not missed:
+            return []
+        if self.taken is not None:
+            nextline = (self.taken[-1] if self.taken else line) + 1
+            self.taken.append(nextline)
+            return [nextline]
+        stream = self.streams.pop(0)
+        self.discarded += len(stream)
+        stream.clear()
+        stream.extend(line + i for i in range(1, self.degree + 1))
+        self.streams.append(stream)
+        return list(stream)
+
+    def clear(self):
+        self.streams = [collections.deque() for i in range(self.STREAMS)]
+        self.taken = None
+
+PREFETCHERS = {'nextline': NextLinePrefetcher, 'stride': StridePrefetcher, 'stream': StreamBufferPrefetcher}
+
+# the counters reported by simulateprefetch
+PREFETCHCOUNTERS = ['Accesses', 'Hits', 'Misses', 'Issued', 'Useful', 'Late', 'Unused', 'Pollution']
+
+# runs a trace through a cache with a prefetcher attached.  Prefetches
+# are counted apart from demand accesses:
+#   Issued     prefetches sent to memory
+#   Useful     prefetched lines later used by a demand access
+#   Late       useful prefetches demanded less than latency accesses
+#              after they were issued, so still in flight
+#   Unused     prefetched lines evicted (or dropped from a stream
+#              buffer) before any demand access
+#   Pollution  demand misses on lines a prefetch had evicted
+# Demand accesses served by a stream buffer count as hits.  Returns a
+# dictionary of PREFETCHCOUNTERS.
+def simulateprefetch(cache, prefetcher, trace, latency):
+    counts = dict.fromkeys(PREFETCHCOUNTERS, 0)
+    tags, sets = cache.splittrace(trace.addr)
+    lines = (trace.addr >> cache.offsetlen).tolist()
+    keys = (trace.addr >> HOTSPOTPAGEBITS).tolist()
+    shift = cache.offsetlen
+    prefetched = set() # lines brought in by a prefetch and not yet used
+    polluted = set()   # lines evicted by a prefetch
+    arrival = {}       # access count at which each prefetch completes
+
+    def evicted(setnum, byprefetch):
+        victim = cache.joinaddr(cache.evictedtag, setnum) >> shift
+        if victim in prefetched:
+            prefetched.discard(victim)
+            counts['Unused'] += 1
+        elif byprefetch:
+            polluted.add(victim)
+
+    def used(line, time):
+        counts['Useful'] += 1
+        if arrival.pop(line, 0) > time:
+            counts['Late'] += 1
+
+    for time, (op, tag, setnum, line, key) in enumerate(zip(trace.op.tolist(), tags.tolist(), sets.tolist(), lines, keys)):
+        if op == 82 or op == 87 or op == 65: # 'R', 'W', 'A'
+            counts['Accesses'] += 1
+            fromstream = prefetcher.buffered and not cache.probe(tag, setnum) and prefetcher.take(line)
+            result = cache.setaccess(tag, setnum, op != 82)
+            if result == 'E' or result == 'D':
+                evicted(setnum, False)
+            firstuse = result == 'H' and line in prefetched
+            if fromstream:
+                used(line, time)
+            elif firstuse:
+                prefetched.discard(line)
+                used(line, time)
+            if result == 'H' or fromstream:
+                counts['Hits'] += 1
+            else:
+                counts['Misses'] += 1
+                if line in polluted:
+                    counts['Pollution'] += 1
+            polluted.discard(line)
+
+            for target in prefetcher.train(line, key, result != 'H', firstuse):
+                # stream buffers fetch every line they are given, other
+                # prefetchers skip lines the cache already holds
+                targettag, targetset, _ = cache.splitaddr(target << shift)
+                if not prefetcher.buffered and cache.probe(targettag, targetset):
+                    continue
+                counts['Issued'] += 1
+                arrival[target] = time + latency
+                if prefetcher.buffered:
+                    continue
+                if cache.setaccess(targettag, targetset, False) != 'M':
+                    evicted(targetset, True)
+                prefetched.add(target)
+                polluted.discard(target)
+        elif op == 70: # 'F'
+            cache.flush()
+        elif op == 73 or op == 66 or op == 84: # 'I', 'B', 'T'
+            cache.invalidate()
+            if op != 73:
+                cache.clear_pLRU()
+            prefetcher.clear()
+            prefetched.clear()
+            polluted.clear()
+            arrival.clear()
+    counts['Unused'] += prefetcher.discarded
+    return counts
+
+# prints the prefetch counters next to the misses of the same cache without prefetching
+def printprefetch(counts, baselinemisses):
+    for counter in PREFETCHCOUNTERS:
+        print("%-10s %12d" % (counter, counts[counter]))
+    if counts['Issued']:
+        print("Accuracy   %11.2f%%" % (100.0*counts['Useful']/counts['Issued']))
+    if baselinemisses:
+        print("Coverage   %11.2f%%  (%d misses without prefetching)" % (100.0*(baselinemisses - counts['Misses'])/baselinemisses, baselinemisses))
+
+# the hex digit value of every byte, used to decode addresses in bulk
+HEXVALUE = np.zeros(256, dtype=np.uint64)
+for digit in range(16):
+    HEXVALUE[ord("0123456789abcdef"[digit])] = digit
+    HEXVALUE[ord("0123456789ABCDEF"[digit])] = digit
+
+# holds a whole I$ or D$ log as NumPy columns, one row per line.
+# op and outcome keep the characters the logger wrote ('R', 'W', 'A',
+# 'F', 'I' and 'H', 'M', 'E', 'D', 'X').  BEGIN, TRAIN and END lines
+# are rows with op 'B', 'T' or 'E' and their text kept in labels.
+class CacheTrace:
+    def __init__(self, addr, op, outcome, labels, digits=16):
+        self.addr = addr
+        self.op = op
+        self.outcome = outcome
+        self.labels = labels
+        self.digits = digits # width of the logged hex addresses
+        self.firstrow = 0 # row of the whole log held in row 0
+        self.lineindex = None # byte offset of every TRACEINDEXSTRIDE'th row of a text log
+        self.indexbase = 0 # row of the whole log held in lineindex[0]
+
+    def __len__(self):
+        return len(self.addr)
+
+    # returns the rows start to stop as a trace sharing the same columns
+    def slice(self, start, stop=None):
+        stop = len(self) if stop is None else stop
+        outcome = None if self.outcome is None else self.outcome[start:stop]
+        labels = {row - start: text for row, text in self.labels.items() if start <= row < stop}
+        piece = CacheTrace(self.addr[start:stop], self.op[start:stop], outcome, labels, self.digits)
+        piece.firstrow = self.firstrow + start
+        piece.lineindex = self.lineindex
+        piece.indexbase = self.indexbase
+        if hasattr(self, 'buffer'):
+            piece.buffer = self.buffer
+        return piece
+
+# rows between the entries of the byte offset index kept for text logs
+TRACEINDEXSTRIDE = 4096
+
+# loads a trace from either a text log or a binary trace written by savetrace
+def loadtrace(path):
+    with open(path, 'rb') as f:
+        magic = f.read(len(TRACEMAGIC))
+    if magic == TRACEMAGIC:
+        return maptrace(path)
+    return parsetextlog(path)
+
+# parses whole lines of an ICacheLogger/DCacheLogger log held in a uint8
+# array.  Returns the address, op and outcome columns, the text of the
+# marker rows, the byte offset of every row in data and the widest
+# address.  Lines that are neither markers nor accesses are dropped.
+# The hex addresses are decoded with vectorized gathers, chunklines
+# lines at a time.
+def parsetextlines(data, chunklines=1 << 20):
+    newlines = np.flatnonzero(data == ord('\n'))
+    if len(data) > 0 and data[-1] != ord('\n'):
+        newlines = np.append(newlines, len(data))
+    starts = np.concatenate(([0], newlines[:-1] + 1)).astype(np.int64)
+    ends = newlines.astype(np.int64)
+    ends -= (ends > starts) & (data[np.maximum(ends - 1, 0)] == ord('\r'))
+    keep = ends > starts
+    starts = starts[keep]
+    ends = ends[keep]
+
+    # markers start with an upper case word, addresses with lower case hex
+    first = data[starts]
+    ismarker = (first >= ord('A')) & (first <= ord('Z'))
+    isaccess = ~ismarker & (ends - starts >= 5)
+    rows = len(starts)
+
+    addr = np.zeros(rows, dtype=np.uint64)
+    op = np.zeros(rows, dtype=np.uint8)
+    outcome = np.full(rows, ord('X'), dtype=np.uint8)
+    op[ismarker] = first[ismarker]
+    op[isaccess] = data[ends[isaccess] - 3]
+    outcome[isaccess] = data[ends[isaccess] - 1]
+
+    accessrows = np.flatnonzero(isaccess)
+    digits = 1
+    for chunk in range(0, len(accessrows), chunklines):
+        chunkrows = accessrows[chunk:chunk + chunklines]
+        hexend = ends[chunkrows] - 4
+        hexlen = hexend - starts[chunkrows]
+        width = int(hexlen.max())
+        digits = max(digits, width)
+        digit = np.arange(width)
+        present = digit < hexlen[:, None]
+        positions = np.where(present, hexend[:, None] - 1 - digit, 0)
+        nibbles = HEXVALUE[data[positions]] * present
+        addr[chunkrows] = (nibbles << (4*digit).astype(np.uint64)).sum(axis=1, dtype=np.uint64)
+
+    labels = {}
+    for row in np.flatnonzero(ismarker).tolist():
+        labels[row] = bytes(data[starts[row]:ends[row]]).decode(errors='replace')
+    # lines that are neither markers nor accesses carry no information
+    valid = ismarker | isaccess
+    if not valid.all():
+        remap = np.cumsum(valid) - 1
+        labels = {int(remap[row]): text for row, text in labels.items()}
+        addr, op, outcome = addr[valid], op[valid], outcome[valid]
+        starts = starts[valid]
+    return (addr, op, outcome, labels, starts, digits)
+
+# parses a log written by the ICacheLogger/DCacheLogger in loggers.sv.
+# The file is read and decoded blockbytes at a time, so apart from the
+# columns of the trace only one block and its per-line arrays are held
+# at once.  offset starts the parse part way into the file at the line
+# that holds row firstrow of the whole log, as recorded in a lineindex.
+def parsetextlog(path, chunklines=1 << 20, offset=0, firstrow=0, blockbytes=1 << 20):
+    (addrs, ops, outcomes, indexes) = ([], [], [], [])
+    labels = {}
+    (rows, digits) = (0, 1)
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        (carry, position) = (b'', offset) # position is the file offset of data
+        while True:
+            block = f.read(blockbytes)
+            data = carry + block
+            if block:
+                cut = data.rfind(b'\n') + 1
+                (data, carry) = (data[:cut], data[cut:])
+            if data:
+                (addr, op, outcome, blocklabels, starts, width) = parsetextlines(np.frombuffer(data, dtype=np.uint8), chunklines)
+                addrs.append(addr)
+                ops.append(op)
+                outcomes.append(outcome)
+                labels.update((rows + row, text) for row, text in blocklabels.items())
+                indexes.append(starts[-rows % TRACEINDEXSTRIDE::TRACEINDEXSTRIDE] + position)
+                rows += len(addr)
+                digits = max(digits, width)
+                position += len(data)
+            if not block:
+                break
+    trace = CacheTrace(joincolumns(addrs, np.uint64), joincolumns(ops, np.uint8), joincolumns(outcomes, np.uint8), labels, digits)
+    trace.firstrow = firstrow
+    trace.lineindex = joincolumns(indexes, np.int64)
+    trace.indexbase = firstrow
+    return trace
+
+# concatenates the columns of the blocks of a log without copying a single block
+def joincolumns(pieces, dtype):
+    if len(pieces) == 1:
+        return pieces[0]
+    return np.concatenate(pieces) if pieces else np.zeros(0, dtype=dtype)
+
+# Binary traces hold the same rows as a text log in fixed-width records
+# so they can be mapped straight into NumPy instead of parsed again.
+#   header:   magic, version (u32), address digits (u32),
+#             record count (u64), marker count (u64)
+#   records:  address (u64) and one byte with the op in bits 2:0
+#             (index into TRACEOPS) and the outcome in bits 5:3
+#             (index into TRACEOUTCOMES)
+#   markers:  row number (u64) of every BEGIN/TRAIN/END record,
+#             followed by their texts separated by newlines
+# all fields are little endian.
+TRACEMAGIC = b'WALLYCT\0'
+TRACEVERSION = 1
+TRACEHEADER = struct.Struct('<8sIIQQ')
+TRACERECORD = np.dtype([('addr', '<u8'), ('code', 'u1')])
+TRACEOPS = np.frombuffer(b'RWAFIBTE', dtype=np.uint8)
+TRACEOUTCOMES = np.frombuffer(b'HMEDX', dtype=np.uint8)
+
+# writes a trace in the binary format read by maptrace
+def savetrace(trace, path):
+    # ops and outcomes outside the tables have no code, so they are refused
+    # rather than written as something else
+    opindex = np.full(256, 255, dtype=np.uint8)
+    opindex[TRACEOPS] = np.arange(len(TRACEOPS))
+    outcomeindex = np.full(256, 255, dtype=np.uint8)
+    outcomeindex[TRACEOUTCOMES] = np.arange(len(TRACEOUTCOMES))
+    outcome = np.full(len(trace), ord('X'), dtype=np.uint8) if trace.outcome is None else trace.outcome
+    for (column, index, kind) in [(trace.op, opindex, "op"), (outcome, outcomeindex, "outcome")]:
+        unknown = np.flatnonzero(index[column] == 255)
+        if len(unknown):
+            row = int(unknown[0])
+            raise ValueError("row %d of the log has %s %r, which a binary trace cannot hold" % (trace.firstrow + row, kind, chr(column[row])))
+
+    records = np.empty(len(trace), dtype=TRACERECORD)
+    records['addr'] = trace.addr
+    records['code'] = opindex[trace.op] | (outcomeindex[outcome] << 3)
+    markerrows = np.array(sorted(trace.labels), dtype='<u8')
+    texts = '\n'.join(trace.labels[row] for row in markerrows.tolist()).encode()
+    with open(path, 'wb') as f:
+        f.write(TRACEHEADER.pack(TRACEMAGIC, TRACEVERSION, trace.digits, len(records), len(markerrows)))
+        f.write(records.tobytes())
+        f.write(markerrows.tobytes())
+        f.write(texts)
+
+# maps a binary trace into memory.  The address column is a zero-copy
+# view of the file; only the one-byte op and outcome columns are decoded.
+def maptrace(path):
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    (magic, version, digits, numrecords, nummarkers) = TRACEHEADER.unpack_from(buffer, 0)
+    if magic != TRACEMAGIC or version != TRACEVERSION:
+        raise ValueError(path + " is not a version " + str(TRACEVERSION) + " binary cache trace")
+    offset = TRACEHEADER.size
+    records = np.frombuffer(buffer, dtype=TRACERECORD, count=numrecords, offset=offset)
+    offset += records.nbytes
+    markerrows = np.frombuffer(buffer, dtype='<u8', count=nummarkers, offset=offset)
+    offset += markerrows.nbytes
+    texts = buffer[offset:].decode().split('\n') if nummarkers else []
+
+    trace = CacheTrace(records['addr'], TRACEOPS[records['code'] & 7], TRACEOUTCOMES[records['code'] >> 3],
+                       dict(zip(markerrows.tolist(), texts)), digits)
+    trace.buffer = buffer # keep the mapping open as long as the views are alive
+    return trace
+
+# runs every row of a trace through the cache and returns a NumPy
+# array holding the simulated outcome character of each row
+def simulate(cache, trace):
+    tags, sets = cache.splittrace(trace.addr)
+    results = []
+    for op, tag, setnum in zip(trace.op.tolist(), tags.tolist(), sets.tolist()):
+        if op == 82: # 'R'
+            results.append(cache.setaccess(tag, setnum, False))
+        elif op == 87 or op == 65: # 'W', 'A'
+            results.append(cache.setaccess(tag, setnum, True))
+        elif op == 70: # 'F'
+            cache.flush()
+            results.append('X')
+        elif op == 73: # 'I'
+            cache.invalidate()
+            results.append('X')
+        elif op == 66 or op == 84: # 'B', 'T'
+            # currently BEGIN and END traces aren't being recorded correctly
+            # trying TRAIN clears instead
+            cache.invalidate() # a new test is starting, so 'empty' the cache
+            cache.clear_pLRU()
+            results.append('X')
+        else:
+            results.append('X')
+    return np.frombuffer(''.join(results).encode(), dtype=np.uint8)
+
+# A snapshot holds the whole Cache (tags, valid and dirty bits and the
+# replacement policy state) after some row of a log, with the running
+# counters and where that row sits in the log, so a long log can be
+# resumed from it without parsing or simulating the rows before it.
+SNAPSHOTVERSION = 2
+SNAPSHOTCOUNTERS = ['Accesses', 'Hits', 'Misses', 'Writebacks', 'Mismatches']
+
+# counts the accesses, hits, misses and writebacks of simulated rows
+def countresults(trace, results):
+    isaccess = (trace.op == ord('R')) | (trace.op == ord('W')) | (trace.op == ord('A'))
+    counts = collections.Counter()
+    counts['Accesses'] = np.count_nonzero(isaccess)
+    counts['Hits'] = np.count_nonzero(isaccess & (results == ord('H')))
+    counts['Misses'] = counts['Accesses'] - counts['Hits']
+    counts['Writebacks'] = np.count_nonzero(isaccess & (results == ord('D')))
+    counts['Mismatches'] = np.count_nonzero(isaccess & (results != trace.outcome))
+    return counts
+
+# saves the state of cache once row (counted within trace) has been simulated
+def savesnapshot(path, cache, trace, row, counts, logpath):
+    state = {'version': SNAPSHOTVERSION, 'log': os.path.abspath(logpath), 'logsize': os.path.getsize(logpath),
+             'row': trace.firstrow + row, 'counts': dict(counts), 'cache': cache}
+    if trace.lineindex is not None:
+        entry = (state['row'] - trace.indexbase) // TRACEINDEXSTRIDE
+        if entry < len(trace.lineindex):
+            state['byteoffset'] = int(trace.lineindex[entry])
+            state['indexrow'] = trace.indexbase + entry*TRACEINDEXSTRIDE
+        else:
+            # the snapshot is at the end of a log whose length is a multiple of
+            # TRACEINDEXSTRIDE, so there is no line left to index
+            state['byteoffset'] = state['logsize']
+            state['indexrow'] = state['row']
+    with gzip.open(path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def loadsnapshot(path):
+    with gzip.open(path, 'rb') as f:
+        state = pickle.load(f)
+    if state.get('version') != SNAPSHOTVERSION:
+        raise ValueError(path + " is not a version " + str(SNAPSHOTVERSION) + " cache snapshot")
+    return state
+
+# loads the rows of a log that follow a snapshot.  Binary traces are
+# mapped and sliced; text logs are parsed from the indexed line at or
+# before the snapshot row, so only the rest of the file is decoded.
+def resumetrace(state, path):
+    if os.path.getsize(path) != state['logsize']:
+        raise ValueError(path + " is not the log the snapshot of " + state['log'] + " was taken from")
+    with open(path, 'rb') as f:
+        magic = f.read(len(TRACEMAGIC))
+    if magic == TRACEMAGIC:
+        return maptrace(path).slice(state['row'])
+    trace = parsetextlog(path, offset=state['byteoffset'], firstrow=state['indexrow'])
+    return trace.slice(state['row'] - state['indexrow'])
+
+# simulates a trace, saving a snapshot after each (row, path) in
+# snapshots.  Rows count from the start of the whole log and counts
+# accumulates the SNAPSHOTCOUNTERS of every simulated row.
+def simulatesnapshots(cache, trace, snapshots, logpath, counts):
+    pieces = []
+    start = 0
+    for (row, path) in sorted(snapshots):
+        stop = min(max(row - trace.firstrow, start), len(trace))
+        piece = trace.slice(start, stop)
+        results = simulate(cache, piece)
+        counts.update(countresults(piece, results))
+        savesnapshot(path, cache, trace, stop, counts, logpath)
+        pieces.append(results)
+        start = stop
+    piece = trace.slice(start)
+    results = simulate(cache, piece)
+    counts.update(countresults(piece, results))
+    pieces.append(results)
+    return np.concatenate(pieces)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Simulates a L1 cache.")
-    parser.add_argument('numlines', type=int, help="The number of lines per way (a power of 2)", metavar="L")
-    parser.add_argument('numways', type=int, help="The number of ways (a power of 2)", metavar='W')
-    parser.add_argument('addrlen', type=int, help="Length of the address in bits (a power of 2)", metavar="A")
-    parser.add_argument('taglen', type=int, help="Length of the tag in bits", metavar="T")
+    parser.add_argument('numlines', type=int, nargs='?', help="The number of lines per way (a power of 2)", metavar="L")
+    parser.add_argument('numways', type=int, nargs='?', help="The number of ways (a power of 2)", metavar='W')
+    parser.add_argument('addrlen', type=int, nargs='?', help="Length of the address in bits (a power of 2)", metavar="A")
+    parser.add_argument('taglen', type=int, nargs='?', help="Length of the tag in bits", metavar="T")
     parser.add_argument('-f', "--file", required=True, help="Log file to simulate from")
     parser.add_argument('-v', "--verbose", action='store_true', help="verbose/full-trace mode")
     parser.add_argument('-p', "--perf", action='store_true', help="Report hit/miss ratio")
     parser.add_argument('-d', "--dist", action='store_true', help="Report distribution of operations")
+    parser.add_argument('-s', "--sweep", nargs='*', metavar="SETS:WAYS:LINEBYTES",
+                        help="Report hits, misses, and writebacks for each geometry instead of checking against Wally. "
+                             "Only --policy lru covers every geometry in a single pass; other policies simulate each geometry in turn. "
+                             "The positional geometry is always included; with no geometries listed the way_* derivative configurations are swept.")
+    parser.add_argument('-c', "--convert", metavar="BINFILE", help="Convert the log to a binary trace and exit. Binary traces can be given to -f")
+    parser.add_argument('-H', "--hierarchy", action='store_true', help="Report line fills, writebacks and bus traffic per test instead of checking against Wally")
+    parser.add_argument("--ifile", help="I$ log recorded alongside the log given to -f, chained into the same hierarchy")
+    parser.add_argument("--victims", type=int, default=0, help="Entries in a victim buffer shared by the L1s (0 for none)")
+    parser.add_argument("--l2", metavar="SETS:WAYS:LINEBYTES", help="Geometry of an L2 shared by the L1s (default none)")
+    parser.add_argument("--hotspots", type=int, metavar="N", help="Report the N lines and N 4 KiB pages with the most misses")
+    parser.add_argument("--hotspotfile", help="Write the hot-spot report to this .csv or .json file instead of stdout")
+    parser.add_argument("--symbols", metavar="ELF_OR_OBJDUMP", help="Name hot spots with the symbols of this ELF or objdump file")
+    parser.add_argument("--prefetch", choices=list(PREFETCHERS), help="Also simulate the cache with this prefetcher and report its effect")
+    parser.add_argument("--prefetchdegree", type=int, default=2, help="Lines fetched per prefetch trigger (stream buffer depth for stream)")
+    parser.add_argument("--prefetchlatency", type=int, default=8, help="Accesses before a prefetch arrives; earlier demands count as late")
+    parser.add_argument('-j', "--jobs", type=int, default=1, help="Split the sets across this many worker processes")
+    parser.add_argument("--snapshot", type=int, action='append', metavar="ROW",
+                        help="Save the cache state after this many rows of the log to <prefix>.<ROW>.snap (may be repeated)")
+    parser.add_argument("--snapshotprefix", help="Prefix of the snapshot files (default the log file name)")
+    parser.add_argument("--resume", metavar="SNAPFILE", help="Start from a snapshot of the same log instead of an empty cache")
+    parser.add_argument("--policy", choices=list(POLICIES), default='plru', help="Replacement policy (Wally uses plru)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the random replacement policy")
 
     args = parser.parse_args()
-    cache = Cache(args.numlines, args.numways, args.addrlen, args.taglen)
     extfile = os.path.expanduser(args.file)
     nofails = True
 
-    if args.perf:
-        hits = 0
-        misses = 0
+    if (args.resume or args.snapshot) and (args.sweep is not None or args.hierarchy or args.convert or args.jobs > 1):
+        parser.error("--snapshot and --resume only apply to a serial run of a single cache")
+    counts = collections.Counter()
+    if args.resume:
+        snapshot = loadsnapshot(os.path.expanduser(args.resume))
+        trace = resumetrace(snapshot, extfile)
+        cache = snapshot['cache']
+        counts.update(snapshot['counts'])
+        geometry = (cache.numsets, cache.numways, cache.addrlen, cache.taglen)
+        if (args.numlines, args.numways, args.addrlen, args.taglen) not in ((None,)*4, geometry):
+            parser.error("L, W, A and T do not match the snapshot's " + " ".join(map(str, geometry)))
+        (args.numlines, args.numways, args.addrlen, args.taglen) = geometry
+        args.policy = cache.policyname
+        print("Resuming at row", trace.firstrow, "of", snapshot['log'])
+    else:
+        trace = loadtrace(extfile)
+
+    if args.convert:
+        try:
+            savetrace(trace, os.path.expanduser(args.convert))
+        except ValueError as error:
+            sys.exit("Cannot convert " + args.file + ": " + str(error))
+        sys.exit(0)
+
+    if None in (args.numlines, args.numways, args.addrlen, args.taglen):
+        parser.error("L, W, A and T are required unless converting a log with -c")
+    if not args.resume:
+        cache = Cache(args.numlines, args.numways, args.addrlen, args.taglen, args.policy, args.seed)
+
+    if args.sweep is not None:
+        geometries = [(args.numlines, args.numways, 2**cache.offsetlen)]
+        for geometry in [parsegeometry(text) for text in args.sweep] or DERIVGEOMETRIES:
+            if geometry not in geometries:
+                geometries.append(geometry)
+        printsweep(sweep(trace, geometries, args.addrlen, args.policy, args.seed), geometries)
+        sys.exit(0)
+
+    if args.hierarchy:
+        l1s = [('D', cache)]
+        traces = [trace]
+        if args.ifile:
+            l1s.append(('I', Cache(args.numlines, args.numways, args.addrlen, args.taglen, args.policy, args.seed)))
+            traces.append(loadtrace(os.path.expanduser(args.ifile)))
+        l2 = None
+        if args.l2:
+            (sets, ways, linebytes) = parsegeometry(args.l2)
+            l2 = Cache(sets, ways, args.addrlen, args.addrlen - int(math.log(sets*linebytes, 2)), args.policy, args.seed)
+        printsegments(simulatehierarchy(Hierarchy(l1s, args.victims, l2), traces), HIERARCHYCOUNTERS)
+        sys.exit(0)
+
+    if args.jobs > 1:
+        results = simulatesharded(cache, trace, args.jobs)
+    elif args.snapshot or args.resume:
+        prefix = os.path.expanduser(args.snapshotprefix or args.file)
+        snapshots = [(row, prefix + "." + str(row) + ".snap") for row in args.snapshot or []]
+        results = simulatesnapshots(cache, trace, snapshots, extfile, counts)
+    else:
+        results = simulate(cache, trace)
+    isaccess = (trace.op == ord('R')) | (trace.op == ord('W')) | (trace.op == ord('A'))
+
+    if args.verbose:
+        tags, sets = cache.splittrace(trace.addr)
+        for row in range(len(trace)):
+            op = chr(trace.op[row])
+            if op == 'B' or op == 'T':
+                print("New Test")
+            elif op == 'F' or op == 'I':
+                print(op)
+            elif isaccess[row]:
+                addr = int(trace.addr[row])
+                print(hex(addr), hex(tags[row]), hex(sets[row]), hex(addr & cache.offsetmask), chr(trace.outcome[row]), chr(results[row]))
+
+    for row in np.flatnonzero(isaccess & (results != trace.outcome)).tolist():
+        addr = "%0*x" % (trace.digits, int(trace.addr[row]))
+        print("Result mismatch at address", addr+ ". Wally:", chr(trace.outcome[row])+", Sim:", chr(results[row]))
+        nofails = False
+    if args.resume and snapshot['counts']['Mismatches']:
+        print("There were", snapshot['counts']['Mismatches'], "mismatches before the snapshot.")
+        nofails = False
 
     if args.dist:
-        loads = 0
-        stores = 0
-        atoms = 0
-        totalops = 0
-
-    with open(extfile, "r") as f:
-        for ln in f:
-            ln = ln.strip()
-            lninfo = ln.split()
-            if len(lninfo) < 3: #non-address line
-                if len(lninfo) > 0 and (lninfo[0] == 'BEGIN' or lninfo[0] == 'TRAIN'):
-                    # currently BEGIN and END traces aren't being recorded correctly
-                    # trying TRAIN clears instead
-                    cache.invalidate() # a new test is starting, so 'empty' the cache
-                    cache.clear_pLRU()
-                    if args.verbose:
-                        print("New Test")
-                        
-            else:
-                if args.dist:
-                    totalops += 1
-                
-                if lninfo[1] == 'F':
-                    cache.flush()
-                    if args.verbose:
-                        print("F")
-                elif lninfo[1] == 'I':
-                    cache.invalidate()
-                    if args.verbose:
-                        print("I")
-                else:
-                    addr = int(lninfo[0], 16)
-                    iswrite = lninfo[1] == 'W' or lninfo[1] == 'A'
-                    result = cache.cacheaccess(addr, iswrite)
-                    
-                    if args.verbose:
-                        tag, setnum, offset = cache.splitaddr(addr)
-                        print(hex(addr), hex(tag), hex(setnum), hex(offset), lninfo[2], result)
-                    
-                    if args.perf:
-                        if result == 'H':
-                            hits += 1
-                        else:
-                            misses += 1
-                    
-                    if args.dist:
-                        if lninfo[1] == 'R':
-                            loads += 1
-                        elif lninfo[1] == 'W':
-                            stores += 1
-                        elif lninfo[1] == 'A':
-                            atoms += 1
-                    
-                    if not result == lninfo[2]:
-                        print("Result mismatch at address", lninfo[0]+ ". Wally:", lninfo[2]+", Sim:", result)
-                        nofails = False
-    if args.dist:
+        totalops = np.count_nonzero(isaccess | (trace.op == ord('F')) | (trace.op == ord('I')))
+        loads = np.count_nonzero(trace.op == ord('R'))
+        stores = np.count_nonzero(trace.op == ord('W'))
+        atoms = np.count_nonzero(trace.op == ord('A'))
         percent_loads = str(round(100*loads/totalops))
         percent_stores = str(round(100*stores/totalops))
         percent_atoms = str(round(100*atoms/totalops))
         print("This log had", percent_loads+"% loads,", percent_stores+"% stores, and", percent_atoms+"% atomic operations.")
     
     if args.perf:
+        hits = np.count_nonzero(isaccess & (results == ord('H')))
+        misses = np.count_nonzero(isaccess) - hits
+        if args.resume:
+            # include the rows simulated before the snapshot was taken
+            hits += snapshot['counts']['Hits']
+            misses += snapshot['counts']['Misses']
         ratio = round(hits/misses,3)
         print("There were", hits, "hits and", misses, "misses. The hit/miss ratio was", str(ratio)+".")
+        if args.resume:
+            # the lines touched before the snapshot and the fully associative shadow
+            # cache are not in it, so the misses cannot be split into the three Cs
+            print("The compulsory/capacity/conflict breakdown is not available when resuming from a snapshot.")
+        else:
+            printsegments(classifymisses(cache, trace, results), MISSCLASSES)
+
+    if args.prefetch:
+        prefetchcache = Cache(args.numlines, args.numways, args.addrlen, args.taglen, args.policy, args.seed)
+        prefetcher = PREFETCHERS[args.prefetch](args.prefetchdegree)
+        baselinemisses = np.count_nonzero(isaccess & (results != ord('H')))
+        printprefetch(simulateprefetch(prefetchcache, prefetcher, trace, args.prefetchlatency), baselinemisses)
+
+    if args.hotspots:
+        symbols = loadsymbols(os.path.expanduser(args.symbols)) if args.symbols else None
+        writehotspots(hotspots(cache, trace, results, args.hotspots, symbols), args.hotspotfile)
     
     if nofails:
-        print("SUCCESS! There were no mismatches between Wally and the sim.")
\ No newline at end of file
+        print("SUCCESS! There were no mismatches between Wally and the sim.")
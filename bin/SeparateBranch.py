@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+###########################################
+## SeparateBranch.py
+##
+## Purpose: Indexes the benchmarks of a branch.log or cfi.log in one streaming pass
+##
+## A component of the CORE-V-WALLY configurable RISC-V project.
+## https://github.com/openhwgroup/cvw
+##
+## Copyright (C) 2021-23 Harvey Mudd College & Oklahoma State University
+##
+## SPDX-License-Identifier: Apache-2.0 WITH SHL-2.1
+##
+## Licensed under the Solderpad Hardware License v 2.1 (the “License”); you may not use this file
+## except in compliance with the License, or, at your option, the Apache License version 2.0. You
+## may obtain a copy of the License at
+##
+## https:##solderpad.org/licenses/SHL-2.1/
+##
+## Unless required by applicable law or agreed to in writing, any work distributed under the
+## License is distributed on an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+## either express or implied. See the License for the specific language governing permissions
+## and limitations under the License.
+################################################################################################
+
+# how to invoke:
+# SeparateBranch.py <branch.log> [--split]
+# A branch.log or cfi.log written by the BPRED_LOGGER in loggers.sv holds every benchmark
+# of a run, each as TRAIN, its warmup branches, BEGIN <memfile>, the measured branches
+# and END <memfile>.  This script reads the log once and writes <log>.idx next to it, a
+# JSON index giving the byte offsets of each benchmark's segment:
+#   start  the TRAIN line (or the end of the previous segment if there is none)
+#   begin  the BEGIN line, or null
+#   end    the END line
+#   stop   the byte after the END line
+# BranchSim.py uses the index to read one benchmark without scanning the rest of the
+# log (-b) and to hand benchmarks to worker processes (-j).  The index records the
+# size and modification time of the log and loadindex rebuilds it when they change.
+# --split also writes each benchmark to its own file, like SeparateBranch.sh did, in a
+# directory named after the log: <benchmark><opt>_<log>, holding the lines between
+# TRAIN and END.
+
+import os
+import re
+import argparse
+import json
+
+INDEXVERSION = 1
+MARKER = re.compile(rb'^(TRAIN|BEGIN|END)\b[^\n]*(\n|$)', re.MULTILINE)
+
+# names a benchmark from its memfile path the way ProcessFile in parseHPMC.py does
+def benchmarkname(memfile):
+    fields = memfile.split('/')
+    return (fields[-1].split('.')[0], fields[-4] if len(fields) >= 4 else '')
+
+def indexpath(path):
+    return path + '.idx'
+
+# scans a log in blocks and returns the segment of every benchmark
+def buildsegments(path, blockbytes=1 << 26):
+    segments = []
+    (start, begin, memfile) = (0, None, None)
+    with open(path, 'rb') as f:
+        (carry, offset) = (b'', 0) # offset is the file position of carry
+        while True:
+            block = f.read(blockbytes)
+            data = carry + block
+            cut = data.rfind(b'\n') + 1 if block else len(data)
+            for match in MARKER.finditer(data, 0, cut):
+                text = match.group(0).decode(errors='replace').strip()
+                position = offset + match.start()
+                if text.startswith('TRAIN'):
+                    (start, begin) = (position, None)
+                elif text.startswith('BEGIN'):
+                    begin = position
+                    memfile = text[6:].strip()
+                else:
+                    memfile = text[4:].strip() or memfile
+                    (name, opt) = benchmarkname(memfile or path)
+                    stop = offset + match.end()
+                    segments.append(dict(name=name, opt=opt, memfile=memfile, start=start, begin=begin, end=position, stop=stop))
+                    (start, begin) = (stop, None)
+            (carry, offset) = (data[cut:], offset + cut)
+            if not block:
+                break
+    return segments
+
+def buildindex(path):
+    stat = os.stat(path)
+    index = dict(version=INDEXVERSION, log=os.path.basename(path), size=stat.st_size, mtime=stat.st_mtime,
+                 segments=buildsegments(path))
+    with open(indexpath(path) + '.tmp', 'w') as f:
+        json.dump(index, f, indent=1)
+    os.replace(indexpath(path) + '.tmp', indexpath(path))
+    return index
+
+# returns the segments of a log, from its index if that is current
+def loadindex(path):
+    stat = os.stat(path)
+    try:
+        with open(indexpath(path)) as f:
+            index = json.load(f)
+        if index['version'] == INDEXVERSION and index['size'] == stat.st_size and index['mtime'] == stat.st_mtime:
+            return index['segments']
+    except (OSError, ValueError, KeyError):
+        pass
+    return buildindex(path)['segments']
+
+# writes every benchmark to its own file and returns their paths
+def split(path, segments):
+    directory = os.path.splitext(path)[0]
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    with open(path, 'rb') as f:
+        for segment in segments:
+            f.seek(segment['start'])
+            if not f.readline().startswith(b'TRAIN'):
+                f.seek(segment['start'])
+            remaining = segment['end'] - f.tell()
+            out = os.path.join(directory, segment['name'] + segment['opt'] + '_' + os.path.basename(path))
+            with open(out, 'wb') as o:
+                while remaining > 0:
+                    block = f.read(min(remaining, 1 << 26))
+                    o.write(block)
+                    remaining -= len(block)
+            paths.append(out)
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indexes the benchmarks of a BPRED_LOGGER branch.log or cfi.log.")
+    parser.add_argument('file', nargs='+', help="branch.log or cfi.log files")
+    parser.add_argument("--split", action='store_true', help="Also write each benchmark to its own file")
+    args = parser.parse_args()
+
+    for path in args.file:
+        segments = buildindex(path)['segments']
+        for segment in segments:
+            print("%-24s %-24s %14d %14d" % (segment['name'], segment['opt'], segment['start'], segment['stop']))
+        if args.split:
+            for out in split(path, segments):
+                print(out)
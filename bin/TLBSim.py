@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+
+###########################################
+## TLBSim.py
+##
+## Purpose: Estimate ITLB/DTLB misses and page walks from a boot trace
+##
+## A component of the CORE-V-WALLY configurable RISC-V project.
+## https://github.com/openhwgroup/cvw
+##
+## Copyright (C) 2021-23 Harvey Mudd College & Oklahoma State University
+##
+## SPDX-License-Identifier: Apache-2.0 WITH SHL-2.1
+##
+## Licensed under the Solderpad Hardware License v 2.1 (the “License”); you may not use this file
+## except in compliance with the License, or, at your option, the Apache License version 2.0. You
+## may obtain a copy of the License at
+##
+## https:##solderpad.org/licenses/SHL-2.1/
+##
+## Unless required by applicable law or agreed to in writing, any work distributed under the
+## License is distributed on an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+## either express or implied. See the License for the specific language governing permissions
+## and limitations under the License.
+################################################################################################
+
+# how to invoke this simulator:
+# TLBSim.py -f <boottrace.log> (--itlb ENTRIES[:WAYS] ...) (--dtlb ENTRIES[:WAYS] ...)
+# boottrace.log is written to sim/logs by wallyTracer.sv when STD_LOG is set, one line
+# per retired instruction with its PC, encoding and register and CSR writes.
+# Every listed ITLB and DTLB is simulated in the same pass over the trace.  The default
+# sizes are those of the tlb2_*, tlb16_* and base rv64gc configurations (2, 16 and 32
+# entries, fully associative).  WAYS defaults to ENTRIES (fully associative, like Wally).
+#
+# The trace does not hold data addresses, so they are rebuilt from the base register
+# and offset of each load, store, AMO and cbo instruction using the register file,
+# which is followed through the rf writes in the trace.  The privilege mode is
+# followed through traps, mret and sret.  wallyTracer.sv only logs a CSR when its
+# value changes, so a second trap with the same cause and epc writes nothing; a
+# trap is seen when the PC reaches the trap vector in mtvec/stvec (or one of its
+# vectored entries), as well as when mepc/mcause or sepc/scause are written.
+# mret and sret return to the mode held in the MPP/SPP field of the followed
+# mstatus, which stays correct because unchanged fields need no log entry.  Accesses are
+# translated when satp selects Sv32/Sv39/Sv48 and the (effective) mode is S or U.
+#
+# Wally flushes the whole TLB on any sfence.vma; --sfence precise instead follows
+# the vaddr/asid operands as the privileged spec allows.  The PTE G bit is not in the
+# trace, so by default pages in the upper half of the address space (the Linux kernel)
+# are treated as global; --global none makes every page belong to its ASID.
+# Page-walk estimates assume every miss walks all levels of the page table to a 4 KiB
+# leaf (3 PTE reads for Sv39), as Wally's hptw has no page-walk cache.
+# Add --policy to change the replacement policy (Wally uses nru, the not-recently-used
+# bits of tlblru.sv) and -n N to stop after N instructions.
+
+import sys
+import os
+import re
+import argparse
+
+from CacheSim import POLICIES
+
+# satp mode encodings and the page table levels walked for each
+SATPMODES = {1: ('Sv32', 2), 8: ('Sv39', 3), 9: ('Sv48', 4)}
+PAGEBITS = 12
+
+CSR_SSTATUS = 0x100
+CSR_STVEC = 0x105
+CSR_SEPC = 0x141
+CSR_SCAUSE = 0x142
+CSR_SATP = 0x180
+CSR_MSTATUS = 0x300
+CSR_MTVEC = 0x305
+CSR_MEPC = 0x341
+CSR_MCAUSE = 0x342
+SSTATUSMASK = (1 << 8) | (1 << 18) | (1 << 19) # SPP, SUM, MXR
+
+MRET = 0x30200073
+SRET = 0x10200073
+MODE_U, MODE_S, MODE_M = 0, 1, 3
+VECTORS = 64 # interrupt causes with an entry in a vectored trap table
+
+WRITE = re.compile(r'(f?rf|csr)\[([0-9a-f]+)\] = ([0-9a-f]+)')
+
+# mirrors tlblru.sv: a recently used bit per entry, set on hits and
+# fills and cleared in every entry once all of them are set.  The
+# victim is the first entry that is not recently used, whether or
+# not it is valid.
+class NRUPolicy:
+    def __init__(self, numsets, numways, seed=0):
+        self.numsets = numsets
+        self.numways = numways
+        self.full = (1 << numways) - 1
+        self.bits = [0]*numsets
+
+    def touch(self, setnum, waynum):
+        bits = self.bits[setnum] | (1 << waynum)
+        self.bits[setnum] = 0 if bits == self.full else bits
+
+    fill = touch
+
+    def victim(self, setnum):
+        bits = self.bits[setnum]
+        return (~bits & (bits + 1)).bit_length() - 1
+
+    def clear(self):
+        self.bits = [0]*self.numsets
+
+TLBPOLICIES = dict(POLICIES, nru=NRUPolicy)
+# policies whose state is unchanged by a hit on the entry that was just
+# filled or hit.  nru is not one (a repeat sets the used bit again after
+# the all-used clear), nor are srrip and brrip (a hit after a fill
+# predicts a near re-reference).
+REPEATSAFEPOLICIES = {'plru', 'lru', 'fifo', 'random'}
+
+class TLB:
+    def __init__(self, name, entries, ways, policy='nru'):
+        self.name = name
+        self.entries = entries
+        self.ways = ways
+        self.sets = entries // ways
+        # Wally refills the not-recently-used entry even when others are invalid
+        self.fillinvalid = policy != 'nru'
+        self.policy = TLBPOLICIES[policy](self.sets, ways)
+        self.repeatsafe = policy in REPEATSAFEPOLICIES
+        self.lines = {} # (vpn, asid or None if global) -> entry
+        self.keys = [None]*entries
+        self.accesses = 0
+        self.misses = 0
+        self.walkreads = 0
+
+    # looks up a page, filling it on a miss; returns True on a hit
+    def access(self, vpn, asid, levels):
+        self.accesses += 1
+        key = (vpn, asid)
+        line = self.lines.get(key)
+        setnum = vpn % self.sets
+        if line is not None:
+            self.policy.touch(setnum, line - setnum*self.ways)
+            return True
+        self.misses += 1
+        self.walkreads += levels
+        base = setnum*self.ways
+        if self.fillinvalid and None in self.keys[base:base+self.ways]:
+            waynum = self.keys.index(None, base, base+self.ways) - base
+        else:
+            waynum = self.policy.victim(setnum) if self.ways > 1 else 0
+        line = base + waynum
+        if self.keys[line] is not None:
+            del self.lines[self.keys[line]]
+        self.keys[line] = key
+        self.lines[key] = line
+        self.policy.fill(setnum, waynum)
+        return False
+
+    # invalidates the entries an sfence.vma selects; None matches everything
+    def flush(self, vpn=None, asid=None):
+        for (line, key) in enumerate(self.keys):
+            if key is None or (vpn is not None and key[0] != vpn):
+                continue
+            if asid is not None and key[1] != asid: # global entries have asid None
+                continue
+            del self.lines[key]
+            self.keys[line] = None
+
+# parses an ENTRIES[:WAYS] argument
+def parsetlb(text):
+    fields = [int(field) for field in text.split(':')]
+    entries = fields[0]
+    ways = fields[1] if len(fields) > 1 else entries
+    if ways < 1 or entries % ways:
+        raise argparse.ArgumentTypeError("ENTRIES must be a multiple of WAYS in " + text)
+    return (entries, ways)
+
+def signextend(value, bits):
+    return value - ((value >> (bits - 1) & 1) << bits)
+
+# returns (rs1, offset) for instructions that access data memory, or None.
+# Covers loads, stores, AMOs and cbo.* of the base ISA and the C and Zcb
+# compressed loads and stores.
+def decodememop(insn, xlen):
+    if insn & 3 == 3:
+        opcode = insn & 0x7f
+        rs1 = (insn >> 15) & 31
+        if opcode == 0x03 or opcode == 0x07: # load, fp load
+            return (rs1, signextend(insn >> 20, 12))
+        if opcode == 0x23 or opcode == 0x27: # store, fp store
+            return (rs1, signextend(((insn >> 25) << 5) | ((insn >> 7) & 31), 12))
+        if opcode == 0x2f: # lr, sc, amo
+            return (rs1, 0)
+        if opcode == 0x0f and (insn >> 12) & 7 == 2: # cbo.*
+            return (rs1, 0)
+        return None
+    quadrant = insn & 3
+    funct3 = (insn >> 13) & 7
+    bit = lambda pos: (insn >> pos) & 1
+    bits = lambda hi, lo: (insn >> lo) & ((1 << (hi - lo + 1)) - 1)
+    if quadrant == 0:
+        rs1 = 8 + bits(9, 7)
+        doubleword = (xlen == 64) if funct3 in (3, 7) else funct3 in (1, 5)
+        if funct3 == 4: # Zcb c.lbu, c.lhu, c.lh, c.sb, c.sh
+            if bits(11, 10) in (0, 2):
+                return (rs1, (bit(5) << 1) | bit(6))
+            return (rs1, bit(5) << 1)
+        if funct3 in (1, 2, 3, 5, 6, 7):
+            if doubleword:
+                return (rs1, (bits(12, 10) << 3) | (bits(6, 5) << 6))
+            return (rs1, (bits(12, 10) << 3) | (bit(6) << 2) | (bit(5) << 6))
+    elif quadrant == 2:
+        doubleword = (xlen == 64) if funct3 in (3, 7) else funct3 in (1, 5)
+        if funct3 in (1, 2, 3): # c.fldsp, c.lwsp, c.ldsp/c.flwsp
+            if doubleword:
+                return (2, (bit(12) << 5) | (bits(6, 5) << 3) | (bits(4, 2) << 6))
+            return (2, (bit(12) << 5) | (bits(6, 4) << 2) | (bits(3, 2) << 6))
+        if funct3 in (5, 6, 7): # c.fsdsp, c.swsp, c.sdsp/c.fswsp
+            if doubleword:
+                return (2, (bits(12, 10) << 3) | (bits(9, 7) << 6))
+            return (2, (bits(12, 9) << 2) | (bits(8, 7) << 6))
+    return None
+
+# returns True if pc is where a trap through tvec enters its handler: the
+# base, or in vectored mode (tvec[1:0] = 1) any of the interrupt entries
+def invector(pc, tvec):
+    if tvec is None:
+        return False
+    base = tvec & ~3
+    if tvec & 3 == 1:
+        return base <= pc < base + 4*VECTORS
+    return pc == base
+
+# follows the trace one retired instruction at a time, looking up the
+# fetch and any data access in every ITLB and DTLB
+def simulate(path, itlbs, dtlbs, xlen=64, sfence='all', kernelglobal=True, limit=None, shortcut=True):
+    addrmask = (1 << xlen) - 1
+    regs = [0]*32
+    mode = MODE_M
+    mstatus = 0
+    satp = 0
+    mtvec = stvec = None
+    memops = {}
+    counts = {'Instructions': 0, 'Fetches': 0, 'DataAccesses': 0, 'SatpWrites': 0, 'SFences': 0}
+    # with a policy in REPEATSAFEPOLICIES, repeated lookups of the page just
+    # used hit in every TLB and leave the replacement state unchanged, so
+    # they are counted without a lookup
+    shortcut = shortcut and all(tlb.repeatsafe for tlb in itlbs + dtlbs)
+    lastipage = lastdpage = None
+
+    with open(path) as f:
+        for line in f:
+            if limit is not None and counts['Instructions'] >= limit:
+                break
+            fields = line.split(',', 2)
+            if len(fields) < 3:
+                continue
+            pc = int(fields[0], 16)
+            insn = int(fields[1], 16)
+            counts['Instructions'] += 1
+            rfwrites = []
+            csrwrites = {}
+            for (kind, index, value) in WRITE.findall(fields[2]):
+                if kind == 'rf':
+                    rfwrites.append((int(index), int(value, 16)))
+                elif kind == 'csr':
+                    csrwrites[int(index, 16)] = int(value, 16)
+
+            # a trap shows up as the handler's first instruction, at the trap
+            # vector, or writing the epc or cause when they change
+            if invector(pc, mtvec) or CSR_MCAUSE in csrwrites or CSR_MEPC in csrwrites:
+                mode = MODE_M
+            elif mode != MODE_M and (invector(pc, stvec) or CSR_SCAUSE in csrwrites or CSR_SEPC in csrwrites):
+                mode = MODE_S
+
+            if xlen == 64:
+                (satpmode, asid) = (satp >> 60, (satp >> 44) & 0xffff)
+            else:
+                (satpmode, asid) = (satp >> 31, (satp >> 22) & 0x1ff)
+            translating = satpmode in SATPMODES
+            if translating:
+                levels = SATPMODES[satpmode][1]
+                if mode != MODE_M:
+                    counts['Fetches'] += 1
+                    vpn = pc >> PAGEBITS
+                    key = (vpn, None if kernelglobal and pc >> (xlen - 1) else asid)
+                    if key != lastipage or not shortcut:
+                        for tlb in itlbs:
+                            tlb.access(key[0], key[1], levels)
+                        lastipage = key
+                    else:
+                        for tlb in itlbs:
+                            tlb.accesses += 1
+
+            memop = memops.get(insn, False)
+            if memop is False:
+                memop = memops[insn] = decodememop(insn, xlen)
+            if memop is not None:
+                vaddr = (regs[memop[0]] + memop[1]) & addrmask
+                datamode = (mstatus >> 11) & 3 if mode == MODE_M and (mstatus >> 17) & 1 else mode
+                if translating and datamode != MODE_M:
+                    counts['DataAccesses'] += 1
+                    vpn = vaddr >> PAGEBITS
+                    key = (vpn, None if kernelglobal and vaddr >> (xlen - 1) else asid)
+                    if key != lastdpage or not shortcut:
+                        for tlb in dtlbs:
+                            tlb.access(key[0], key[1], levels)
+                        lastdpage = key
+                    else:
+                        for tlb in dtlbs:
+                            tlb.accesses += 1
+
+            if insn & 0xfe007fff == 0x12000073: # sfence.vma
+                counts['SFences'] += 1
+                rs1 = (insn >> 15) & 31
+                rs2 = (insn >> 20) & 31
+                for tlb in itlbs + dtlbs:
+                    if sfence == 'all':
+                        tlb.flush()
+                    else:
+                        tlb.flush(((regs[rs1] & addrmask) >> PAGEBITS) if rs1 else None,
+                                  (regs[rs2] & 0xffff) if rs2 else None)
+                lastipage = lastdpage = None
+            elif insn == MRET:
+                mode = (mstatus >> 11) & 3
+            elif insn == SRET:
+                mode = (mstatus >> 8) & 1
+
+            for (index, value) in rfwrites:
+                regs[index] = value
+            regs[0] = 0
+            if CSR_MSTATUS in csrwrites:
+                mstatus = csrwrites[CSR_MSTATUS]
+            elif CSR_SSTATUS in csrwrites:
+                mstatus = (mstatus & ~SSTATUSMASK) | (csrwrites[CSR_SSTATUS] & SSTATUSMASK)
+            if CSR_MTVEC in csrwrites:
+                mtvec = csrwrites[CSR_MTVEC]
+            if CSR_STVEC in csrwrites:
+                stvec = csrwrites[CSR_STVEC]
+            if CSR_SATP in csrwrites:
+                counts['SatpWrites'] += 1
+                satp = csrwrites[CSR_SATP]
+                lastipage = lastdpage = None
+    return counts
+
+def printtlbs(tlbs):
+    print("%-6s %8s %6s %14s %12s %10s %14s" % ("TLB", "Entries", "Ways", "Accesses", "Misses", "MissRate", "WalkReads"))
+    for tlb in tlbs:
+        rate = 100.0*tlb.misses/tlb.accesses if tlb.accesses else 0.0
+        print("%-6s %8d %6d %14d %12d %9.4f%% %14d" % (tlb.name, tlb.entries, tlb.ways, tlb.accesses, tlb.misses, rate, tlb.walkreads))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimates ITLB and DTLB misses and page walks from a boottrace.log.")
+    parser.add_argument('-f', "--file", default=os.path.expandvars("$WALLY/sim/logs/boottrace.log"), help="Boot trace written by wallyTracer.sv")
+    parser.add_argument("--itlb", type=parsetlb, nargs='+', default=[(2, 2), (16, 16), (32, 32)], metavar="ENTRIES[:WAYS]", help="ITLB configurations to simulate")
+    parser.add_argument("--dtlb", type=parsetlb, nargs='+', default=[(2, 2), (16, 16), (32, 32)], metavar="ENTRIES[:WAYS]", help="DTLB configurations to simulate")
+    parser.add_argument("--policy", choices=list(TLBPOLICIES), default='nru', help="Replacement policy (Wally uses nru)")
+    parser.add_argument("--sfence", choices=['all', 'precise'], default='all', help="Flush everything on sfence.vma (Wally) or only the selected page/ASID")
+    parser.add_argument("--global", dest='globalpages', choices=['kernel', 'none'], default='kernel', help="Treat upper-half (kernel) pages as global, or none")
+    parser.add_argument("--xlen", type=int, choices=[32, 64], default=64, help="XLEN of the traced configuration")
+    parser.add_argument('-n', "--instructions", type=int, help="Stop after this many instructions")
+    args = parser.parse_args()
+
+    itlbs = [TLB("ITLB", entries, ways, args.policy) for (entries, ways) in args.itlb]
+    dtlbs = [TLB("DTLB", entries, ways, args.policy) for (entries, ways) in args.dtlb]
+    counts = simulate(os.path.expanduser(args.file), itlbs, dtlbs, args.xlen, args.sfence, args.globalpages == 'kernel', args.instructions)
+    print(", ".join(name + " " + str(count) for (name, count) in counts.items()))
+    printtlbs(itlbs + dtlbs)
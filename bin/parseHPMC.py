@@ -32,6 +32,9 @@ import matplotlib.pyplot as plt
 import math
 import numpy as np
 import argparse
+import pickle
+import re
+import multiprocessing
 
 
 RefDataBP = [('twobitCModel6', 'twobitCModel', 64, 128, 10.0060297551637), ('twobitCModel8', 'twobitCModel', 256, 512, 8.4320392215602), ('twobitCModel10', 'twobitCModel', 1024, 2048, 7.29493318805151),
@@ -56,68 +59,185 @@ def ParseBranchListFile(path):
         #print(predictorLog, predictorType, predictorParams)
     return lst
     
-def ProcessFile(fileName):
+# Only three kinds of transcript lines matter.  They are found with a literal search for KeyWords so the
+# rest of the transcript is never split into tokens, then each line found is matched against its pattern.
+KeyWords = [b'Read memfile', b'Cnt', b'is done']
+MemfileLine = re.compile(rb'\S+\s+Read\s+memfile\s+(\S+)')
+CounterLine = re.compile(rb'\S+\s+Cnt[^=\n]*=\s*(\S+)\s+(\S[^\n]*)')
+
+def ProcessFile(fileName, blockSize = 1 << 26):
     '''Extract preformance counters from a modelsim log.  Outputs a list of tuples for each test/benchmark.
     The tuple contains the test name, optimization characteristics, and dictionary of performance counters.'''
     # 1 find lines with Read memfile and extract test name
     # 2 parse counters into a list of (name, value) tuples (dictionary maybe?)
+    # The transcript is streamed in blocks of whole lines.
     benchmarks = []
-    transcript = open(fileName, 'r')
     HPMClist = { }
     testName = ''
-    for line in transcript.readlines():
-        lineToken = line.split()
-        if(len(lineToken) > 3 and lineToken[1] == 'Read' and lineToken[2] == 'memfile'):
-            opt = lineToken[3].split('/')[-4]
-            testName = lineToken[3].split('/')[-1].split('.')[0]
-            HPMClist = { }
-        elif(len(lineToken) > 4 and lineToken[1][0:3] == 'Cnt'):
-            countToken = line.split('=')[1].split()
-            value = int(countToken[0]) if countToken[0] != 'x' else 0
-            name = ' '.join(countToken[1:])
-            HPMClist[name] = value
-        elif ('is done' in line):
-            benchmarks.append((testName, opt, HPMClist))
+    opt = ''
+    with open(fileName, 'rb') as transcript:
+        carry = b''
+        while True:
+            block = transcript.read(blockSize)
+            data = carry + block
+            cut = data.rfind(b'\n') + 1 if block else len(data)
+            lineStarts = set()
+            for keyWord in KeyWords:
+                position = data.find(keyWord, 0, cut)
+                while(position >= 0):
+                    lineStart = data.rfind(b'\n', 0, position) + 1
+                    lineStarts.add(lineStart)
+                    lineEnd = data.find(b'\n', position, cut)
+                    position = data.find(keyWord, lineEnd, cut) if lineEnd >= 0 else -1
+            for lineStart in sorted(lineStarts):
+                lineEnd = data.find(b'\n', lineStart, cut)
+                line = data[lineStart:lineEnd if lineEnd >= 0 else cut]
+                memfile = MemfileLine.match(line)
+                counter = CounterLine.match(line) if memfile is None else None
+                if(memfile):
+                    path = memfile.group(1).decode(errors='replace').split('/')
+                    opt = path[-4]
+                    testName = path[-1].split('.')[0]
+                    HPMClist = { }
+                elif(counter):
+                    value = counter.group(1)
+                    HPMClist[' '.join(counter.group(2).decode(errors='replace').split())] = int(value) if value != b'x' else 0
+                elif(b'is done' in line):
+                    benchmarks.append((testName, opt, HPMClist))
+            carry = data[cut:]
+            if not block: break
     return benchmarks
 
 
-def ComputeStats(benchmarks):
-    for benchmark in benchmarks:
-        (nameString, opt, dataDict) = benchmark
-        dataDict['CPI'] = 1.0 * int(dataDict['Mcycle']) / int(dataDict['InstRet'])
-        dataDict['BDMR'] = 100.0 * int(dataDict['BP Dir Wrong']) / int(dataDict['Br Count'])
-        dataDict['BTMR'] = 100.0 * int(dataDict['BP Target Wrong']) / (int(dataDict['Br Count']) + int(dataDict['Jump Not Return']))
-        dataDict['RASMPR'] = 100.0 * int(dataDict['RAS Wrong']) / int(dataDict['Return'])
-        dataDict['ClassMPR'] = 100.0 * int(dataDict['Instr Class Wrong']) / int(dataDict['InstRet'])
-        dataDict['ICacheMR'] = 100.0 * int(dataDict['I Cache Miss']) / int(dataDict['I Cache Access'])
-
-        cycles = int(dataDict['I Cache Miss'])
-        if(cycles == 0): ICacheMR = 0
-        else: ICacheMR = 100.0 * int(dataDict['I Cache Cycles']) / cycles
-        dataDict['ICacheMT'] = ICacheMR
-
-        dataDict['DCacheMR'] = 100.0 * int(dataDict['D Cache Miss']) / int(dataDict['D Cache Access'])
-
-        (nameString, opt, dataDict) = benchmark
-        cycles = int(dataDict['D Cache Miss'])
-        if(cycles == 0): DCacheMR = 0
-        else: DCacheMR = 100.0 * int(dataDict['D Cache Cycles']) / cycles
-        dataDict['DCacheMT'] = DCacheMR
-
-
-def ComputeGeometricAverage(benchmarks):
-    fields = ['BDMR', 'BTMR', 'RASMPR', 'ClassMPR', 'ICacheMR', 'DCacheMR', 'CPI', 'ICacheMT', 'DCacheMT']
-    AllAve = {}
-    for field in fields:
-        Product = 1
-        index = 0
-        for (testName, opt, HPMCList) in benchmarks:
-            #print(HPMCList)
-            value = HPMCList[field]
-            if(value != 0): Product *= value # if that value is 0 exclude from mean because it destories the geo mean
-            index += 1
-        AllAve[field] = Product ** (1.0/index)
-    benchmarks.append(('Mean', '', AllAve))
+TranscriptCacheVersion = 1
+
+def TranscriptCachePath(sourcesPath):
+    '''The parsed transcripts of a list file are cached next to it.'''
+    return sourcesPath + '.hpmccache'
+
+def LoadTranscriptCache(cachePath):
+    '''Returns the cached transcripts as a dictionary of absolute path -> (size, mtime, benchmarks).
+    A missing, unreadable or out of date cache is treated as empty.'''
+    try:
+        with open(cachePath, 'rb') as cacheFile:
+            cache = pickle.load(cacheFile)
+        if(cache['version'] == TranscriptCacheVersion): return cache['transcripts']
+    except (OSError, EOFError, pickle.UnpicklingError, KeyError, TypeError, AttributeError):
+        pass
+    return { }
+
+def SaveTranscriptCache(cachePath, transcripts):
+    try:
+        with open(cachePath + '.tmp', 'wb') as cacheFile:
+            pickle.dump({'version': TranscriptCacheVersion, 'transcripts': transcripts}, cacheFile, pickle.HIGHEST_PROTOCOL)
+        os.replace(cachePath + '.tmp', cachePath)
+    except OSError as error:
+        print(f'Warning: could not write transcript cache {cachePath}: {error}')
+
+def ProcessFileCached(fileName, cache):
+    '''ProcessFile, reusing the cached result when the transcript's size and mtime are unchanged.'''
+    stat = os.stat(fileName)
+    key = os.path.abspath(fileName)
+    entry = cache.get(key)
+    if(entry is None or entry[0] != stat.st_size or entry[1] != stat.st_mtime_ns):
+        entry = (stat.st_size, stat.st_mtime_ns, ProcessFile(fileName))
+    cache[key] = entry
+    return entry[2]
+
+# Derived metrics, each computed from whole counter columns at once.  Counter(name) returns the
+# [configuration, benchmark] slice of a counter.
+DerivedMetrics = {
+    'CPI':      lambda Counter: Counter('Mcycle') / Counter('InstRet'),
+    'BDMR':     lambda Counter: 100.0 * Counter('BP Dir Wrong') / Counter('Br Count'),
+    'BTMR':     lambda Counter: 100.0 * Counter('BP Target Wrong') / (Counter('Br Count') + Counter('Jump Not Return')),
+    'RASMPR':   lambda Counter: 100.0 * Counter('RAS Wrong') / Counter('Return'),
+    'ClassMPR': lambda Counter: 100.0 * Counter('Instr Class Wrong') / Counter('InstRet'),
+    'ICacheMR': lambda Counter: 100.0 * Counter('I Cache Miss') / Counter('I Cache Access'),
+    'ICacheMT': lambda Counter: np.where(Counter('I Cache Miss') == 0, 0.0, 100.0 * Counter('I Cache Cycles') / Counter('I Cache Miss')),
+    'DCacheMR': lambda Counter: 100.0 * Counter('D Cache Miss') / Counter('D Cache Access'),
+    'DCacheMT': lambda Counter: np.where(Counter('D Cache Miss') == 0, 0.0, 100.0 * Counter('D Cache Cycles') / Counter('D Cache Miss'))
+}
+
+# CPI stack penalty model.  Every retired instruction costs one base cycle, and each stall counter adds
+# the cycles it implies:
+#   Branch Mispredict  BP Wrong * BranchMispredictPenalty.  A misprediction is found in Execute and
+#                      flushes the wrong-path instructions in Fetch and Decode, losing 2 cycles.
+#   I$ Miss            I Cache Cycles, the cycles Fetch stalls on I$ misses
+#   D$ Miss            D Cache Cycles, the cycles Memory stalls on D$ misses
+#   Load Use           Load Stall, one cycle for each instruction waiting on the load ahead of it
+#   Store              Store Stall, one cycle for each load or AMO right after a store or AMO
+#   Divide             Divide Cycles, the cycles the integer or floating point divider is busy
+#   Other              the rest of Mcycle: CSR and fence flushes, traps, multiply and FPU stalls.
+#                      Stalls that overlap are counted in each component, which can make Other negative.
+BranchMispredictPenalty = 2
+CPIStackComponents = [
+    ('Base',              lambda Counter: Counter('InstRet')),
+    ('Branch Mispredict', lambda Counter: BranchMispredictPenalty * Counter('BP Wrong')),
+    ('I$ Miss',           lambda Counter: Counter('I Cache Cycles')),
+    ('D$ Miss',           lambda Counter: Counter('D Cache Cycles')),
+    ('Load Use',          lambda Counter: Counter('Load Stall')),
+    ('Store',             lambda Counter: Counter('Store Stall')),
+    ('Divide',            lambda Counter: Counter('Divide Cycles'))
+]
+
+class CounterStore:
+    '''The performance counters of every predictor configuration and benchmark in one array,
+    data[configuration, benchmark, counter].  Benchmarks missing from a configuration's transcript are NaN.
+    configs holds the (name, prefixName, entries, size) of each configuration and benchmarks the (name, opt)
+    of each benchmark in the order they first appear.'''
+    def __init__(self, configs, transcripts):
+        self.configs = configs
+        self.benchmarks = []
+        self.counters = []
+        benchmarkIndex = { }
+        counterIndex = { }
+        for benchmarks in transcripts:
+            for (testName, opt, HPMClist) in benchmarks:
+                if (testName, opt) not in benchmarkIndex:
+                    benchmarkIndex[(testName, opt)] = len(self.benchmarks)
+                    self.benchmarks.append((testName, opt))
+                for name in HPMClist:
+                    if name not in counterIndex:
+                        counterIndex[name] = len(self.counters)
+                        self.counters.append(name)
+        self.counterIndex = counterIndex
+        self.data = np.full((len(configs), len(self.benchmarks), len(self.counters)), np.nan)
+        for (config, benchmarks) in enumerate(transcripts):
+            for (testName, opt, HPMClist) in benchmarks:
+                row = self.data[config, benchmarkIndex[(testName, opt)]]
+                for (name, value) in HPMClist.items():
+                    row[counterIndex[name]] = value
+
+    def Counter(self, name):
+        return self.data[:, :, self.counterIndex[name]]
+
+    def Present(self):
+        '''True for each [configuration, benchmark] found in the configuration's transcript.'''
+        return ~np.isnan(self.data).all(axis=2) if len(self.counters) else np.zeros(self.data.shape[:2], dtype=bool)
+
+    def Metric(self, metric):
+        '''A [configuration, benchmark] array of a derived metric or raw counter.'''
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return DerivedMetrics[metric](self.Counter) if metric in DerivedMetrics else self.Counter(metric)
+
+    def CPIStack(self):
+        '''The cycles of each CPI stack component, a [configuration, benchmark, component] array ending with
+        Other, and the component names.'''
+        names = [name for (name, Cycles) in CPIStackComponents] + ['Other']
+        cycles = np.stack([Cycles(self.Counter) for (name, Cycles) in CPIStackComponents], axis=2)
+        other = self.Counter('Mcycle') - cycles.sum(axis=2)
+        return (np.concatenate((cycles, other[:, :, None]), axis=2), names)
+
+    def GeometricMean(self, values):
+        '''The geometric mean over the benchmarks of each configuration, taken as a mean of logarithms so it
+        cannot overflow.  Zero values are left out of the product because they destroy the geometric mean,
+        but are still counted.'''
+        present = self.Present()
+        nonzero = present & (values != 0)
+        count = present.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            logSum = np.where(nonzero, np.log(np.where(nonzero, values, 1.0)), 0.0).sum(axis=1)
+            return np.where(count > 0, np.exp(logSum / np.maximum(count, 1)), 0.0)
 
 def GenerateName(predictorType, predictorParams):
     if(predictorType == 'gshare' or  predictorType == 'twobit' or predictorType == 'btb' or predictorType == 'class' or predictorType == 'ras' or predictorType == 'global'):
@@ -159,63 +279,109 @@ def ComputePredSize(predictorType, predictorParams):
         print(f'Error unsupported predictor type {predictorType}')
         sys.exit(-1)
         
-def BuildDataBase(predictorLogs):
-    # Once done with the following loop, performanceCounterList will contain the predictor type and size along with the
-    # raw performance counter data and the processed data on a per benchmark basis.  It also includes the geometric mean.
-    # list
-    #   branch predictor configuration 0 (tuple)
-    #     benchmark name
-    #     compiler optimization
-    #     data (dictionary)
-    #       dictionary of performance counters
-    #   branch predictor configuration 1 (tuple)
-    #     benchmark name (dictionary)
-    #     compiler optimization
-    #     data
-    #       dictionary of performance counters
-    # ...
-    performanceCounterList = []
+def BuildDataBase(predictorLogs, cachePath=None, jobs=1):
+    # Returns a CounterStore holding the performance counters of every branch predictor configuration
+    # (trace) and benchmark, with the name, display name, entries and size of each configuration.
+    # With a cachePath, transcripts parsed by an earlier run are reused unless they changed.
+    configs = []
+    transcripts = []
+    # Transcripts that are not cached are parsed by up to jobs processes at once.
+    cache = LoadTranscriptCache(cachePath) if cachePath else { }
+    usedCache = { }
+    changed = False
+    stale = []
+    for (predictorLog, predictorType, predictorParams) in predictorLogs:
+        entry = cache.get(os.path.abspath(predictorLog))
+        stat = os.stat(predictorLog)
+        if((entry is None or entry[0] != stat.st_size or entry[1] != stat.st_mtime_ns) and predictorLog not in stale):
+            stale.append(predictorLog)
+    if(jobs > 1 and len(stale) > 1):
+        with multiprocessing.get_context('fork').Pool(min(jobs, len(stale))) as pool: # the workers must not rerun the script
+            parsed = pool.map(ProcessFile, stale, chunksize=1)
+        for (predictorLog, benchmarks) in zip(stale, parsed):
+            stat = os.stat(predictorLog)
+            cache[os.path.abspath(predictorLog)] = (stat.st_size, stat.st_mtime_ns, benchmarks)
+        changed = True
     for trace in predictorLogs:
         predictorLog = trace[0]
         predictorType = trace[1]
         predictorParams = trace[2]
         # Extract the performance counter data
-        performanceCounters = ProcessFile(predictorLog)
-        ComputeStats(performanceCounters)
-        ComputeGeometricAverage(performanceCounters)
-        #print(performanceCounters)
-        performanceCounterList.append([GenerateName(predictorType, predictorParams), GenerateDisplayName(predictorType, predictorParams), performanceCounters, ComputePredNumEntries(predictorType, predictorParams), ComputePredSize(predictorType, predictorParams)])
-    return performanceCounterList
-
-def ReorderDataBase(performanceCounterList):
-    # Reorder the data so the benchmark name comes first, then the branch predictor configuration
-    benchmarkFirstList = []
-    for (predictorName, predictorPrefixName, benchmarks, entries, size) in performanceCounterList:
-        for benchmark in benchmarks:
-            (nameString, opt, dataDict) = benchmark
-            benchmarkFirstList.append((nameString, opt, predictorName, predictorPrefixName, entries, size, dataDict))
-    return benchmarkFirstList
-
-def ExtractSelectedData(benchmarkFirstList):
-    # now extract all branch prediction direction miss rates for each
-    # namestring + opt, config
+        key = os.path.abspath(predictorLog)
+        cached = cache.get(key)
+        performanceCounters = ProcessFileCached(predictorLog, cache)
+        changed = changed or cache[key] is not cached
+        usedCache[key] = cache[key]
+        configs.append((GenerateName(predictorType, predictorParams), GenerateDisplayName(predictorType, predictorParams), ComputePredNumEntries(predictorType, predictorParams), ComputePredSize(predictorType, predictorParams)))
+        transcripts.append(performanceCounters)
+    if(cachePath and (changed or usedCache.keys() != cache.keys())): SaveTranscriptCache(cachePath, usedCache)
+    return CounterStore(configs, transcripts)
+
+def ExtractSelectedData(store, metric):
+    # Slices one metric out of the store as a dictionary of benchmark name -> list of
+    # (config, prefixName, entries, size, value), with the geometric mean of each configuration under 'Mean'.
+    # use this code to distinguish speed opt and size opt.
+    #if opt == 'bd_speedopt_speed': NewName = name+'Sp'
+    #elif opt == 'bd_sizeopt_speed': NewName = name+'Sz'
+    #else: NewName = name
+    values = store.Metric(metric)
+    present = store.Present()
     benchmarkDict = { }
-    for benchmark in benchmarkFirstList:
-        (name, opt, config, prefixName, entries, size, dataDict) = benchmark
-        #print(f'config = {config}, prefixName = {prefixName} entries = {entries}')
-        # use this code to distinguish speed opt and size opt.
-        #if opt == 'bd_speedopt_speed': NewName = name+'Sp'
-        #elif opt == 'bd_sizeopt_speed': NewName = name+'Sz'
-        #else: NewName = name
+    for (benchmark, (name, opt)) in enumerate(store.benchmarks):
         NewName = name
-        #print(NewName)
         #NewName = name+'_'+opt
-        if NewName in benchmarkDict:
-            benchmarkDict[NewName].append((config, prefixName, entries, size, dataDict[ReportPredictorType]))
-        else:
-            benchmarkDict[NewName] = [(config, prefixName, entries, size, dataDict[ReportPredictorType])]
+        for (config, (configName, prefixName, entries, size)) in enumerate(store.configs):
+            if present[config, benchmark]:
+                benchmarkDict.setdefault(NewName, []).append((configName, prefixName, entries, size, float(values[config, benchmark])))
+    means = store.GeometricMean(values)
+    benchmarkDict['Mean'] = [(configName, prefixName, entries, size, float(mean)) for ((configName, prefixName, entries, size), mean) in zip(store.configs, means)]
     return benchmarkDict
 
+def ReportCPIStack(store, FileName):
+    '''Splits the CPI of every configuration into the components of the CPI stack penalty model.  Each
+    benchmark is reported on its own, and the summary (Total) adds up the cycles and instructions of all
+    benchmarks so the components sum to the aggregate CPI.'''
+    (cycles, names) = store.CPIStack()
+    present = store.Present()
+    instRet = store.Counter('InstRet')
+    stacks = { }
+    if(not args.summary):
+        for (benchmark, (name, opt)) in enumerate(store.benchmarks):
+            for (config, (configName, prefixName, entries, size)) in enumerate(store.configs):
+                if present[config, benchmark]:
+                    stacks.setdefault(name, []).append((configName, cycles[config, benchmark] / instRet[config, benchmark]))
+    totalCycles = np.where(present[:, :, None], cycles, 0).sum(axis=1)
+    totalInstRet = np.where(present, instRet, 0).sum(axis=1)
+    stacks['Total'] = [(configName, totalCycles[config] / max(totalInstRet[config], 1)) for (config, (configName, prefixName, entries, size)) in enumerate(store.configs)]
+
+    if(ReportMode == 'table' or ReportMode == 'text'):
+        sys.stdout.write('%-24s%-16s' % ('benchmark', 'config') + ''.join('%-20s' % name for name in names) + 'CPI\n')
+        for benchmark in stacks:
+            for (configName, stack) in stacks[benchmark]:
+                sys.stdout.write('%-24s%-16s' % (benchmark, configName) + ''.join('%-20.4f' % value for value in stack) + '%0.4f\n' % stack.sum())
+
+    if(ReportMode == 'gui'):
+        colors = ['lightgray', 'red', 'blue', 'dodgerblue', 'orange', 'gold', 'purple', 'black']
+        groups = list(stacks)
+        configNames = [configName for (configName, prefixName, entries, size) in store.configs]
+        fig, axes = plt.subplots(figsize = (max(6, len(groups) * len(configNames) / 3), 5))
+        barWidth = 1 / (len(configNames) + 1)
+        for (group, benchmark) in enumerate(groups):
+            for (configName, stack) in stacks[benchmark]:
+                xpos = group + configNames.index(configName) * barWidth
+                bottom = 0
+                for (component, value) in enumerate(np.maximum(stack, 0)): # a negative Other is not drawn
+                    axes.bar(xpos, value, width=barWidth, bottom=bottom, color=colors[component % len(colors)], edgecolor='grey',
+                             label=names[component] if group == 0 and xpos == 0 else None)
+                    bottom += value
+        axes.set_xticks([group + barWidth * (len(configNames) / 2 - 0.5) for group in range(len(groups))])
+        axes.set_xticklabels(groups if len(groups) > 1 else [', '.join(configNames)])
+        axes.set_ylabel('CPI')
+        axes.set_title('CPI Stack')
+        axes.legend(loc='upper right')
+        if(FileName == None): plt.show()
+        else: plt.savefig(FileName)
+
 def ReportAsTable(benchmarkDict):
     refLine = benchmarkDict['Mean']
     FirstLine = []
@@ -428,12 +594,15 @@ metric.add_argument('-r', '--ras', action='store_const', help='Plot return addre
 metric.add_argument('-d', '--direction', action='store_const', help='Plot direction prediction (2-bit, Gshare, local, etc) performance.', default=False, const=True)
 metric.add_argument('-t', '--target', action='store_const', help='Plot branch target buffer (BTB) performance.', default=False, const=True)
 metric.add_argument('-c', '--iclass', action='store_const', help='Plot instruction classification performance.', default=False, const=True)
+metric.add_argument('--cpistack', action='store_const', help='Split the CPI of each configuration into base, branch mispredict, I$ miss, D$ miss, load use, store, divide and other cycles, drawn as stacked bars.', default=False, const=True)
 
 parser.add_argument('-s', '--summary', action='store_const', help='Show only the geometric average for all benchmarks.', default=False, const=True)
 parser.add_argument('-b', '--bar', action='store_const', help='Plot graphs.', default=False, const=True)
-parser.add_argument('-g', '--reference', action='store_const', help='Include the golden reference model from branch-predictor-simulator. Data stored statically at the top of %(prog)s.  If you need to regenreate use CModelBranchAcurracy.sh', default=False, const=True)
+parser.add_argument('-g', '--reference', action='store_const', help='Include the golden reference model from branch-predictor-simulator. Data stored statically at the top of %(prog)s.  If you need to regenerate RefDataBP use BranchSim.py --refdata', default=False, const=True)
 parser.add_argument('-i', '--invert', action='store_const', help='Invert metric. Example Branch miss prediction becomes prediction accuracy. 100 - miss rate', default=False, const=True)
 parser.add_argument('--size', action='store_const', help='Display x-axis as size in bits rather than number of table entries', default=False, const=True)
+parser.add_argument('-j', '--jobs', type=int, help='Number of transcripts to parse in parallel (default: number of CPUs)', default=os.cpu_count())
+parser.add_argument('--nocache', action='store_const', help='Parse every transcript instead of reusing those cached in <sources>.hpmccache by earlier runs', default=False, const=True)
 
 displayMode = parser.add_mutually_exclusive_group()
 displayMode.add_argument('--text', action='store_const', help='Display in text format only.', default=False, const=True)
@@ -463,9 +632,12 @@ if(args.debug): ReportMode = 'debug'
 # local history and tage.
 # <file> <type> <size>
 predictorLogs = ParseBranchListFile(args.sources[0])          # digests the traces
-performanceCounterList = BuildDataBase(predictorLogs)         # builds a database of performance counters by trace and then by benchmark
-benchmarkFirstList = ReorderDataBase(performanceCounterList)  # reorder first by benchmark then trace
-benchmarkDict = ExtractSelectedData(benchmarkFirstList)       # filters to just the desired performance counter metric
+cachePath = None if args.nocache else TranscriptCachePath(args.sources[0])
+store = BuildDataBase(predictorLogs, cachePath, args.jobs)    # builds a columnar store of performance counters by trace and benchmark
+if(args.cpistack):
+    ReportCPIStack(store, args.FileName)
+    sys.exit(0)
+benchmarkDict = ExtractSelectedData(store, ReportPredictorType) # slices out the desired performance counter metric
 
 if(args.reference and args.direction): benchmarkDict['Mean'].extend(RefDataBP)
 if(args.reference and args.target): benchmarkDict['Mean'].extend(RefDataBTB)
@@ -115,6 +115,8 @@ def main():
                     grepstr="")
                 configs.append(tc)
 
+    # the target, class and ras sweeps can also be modeled from the cfi.log of a single run with
+    # BranchSim.py -f cfi.log -p btb:<size>, class:<size> or ras:<size>
     if(args.target):
         # BTB and class size sweep
         bpdSize = [6, 8, 10, 12, 14, 16]
@@ -7,7 +7,7 @@
 ## Created: 11 April 2023
 ## Modified: 12 April 2023
 ##
-## Purpose: Run the cache simulator on each rv64gc test suite in turn. 
+## Purpose: Run the cache simulator on each rv64gc test suite in parallel. 
 ##
 ## A component of the CORE-V-WALLY configurable RISC-V project.
 ## https://github.com/openhwgroup/cvw
@@ -30,12 +30,20 @@
 import sys
 import os
 import argparse
+import json
+import multiprocessing
+import numpy as np
 
-# NOTE: make sure testbench.sv has the ICache and DCache loggers enabled!
+# Each test suite is simulated in its own directory under sim/questa/cachesim so the
+# ICache.log and DCache.log written by the loggers never collide, and the simulations
+# run in a process pool.  As soon as a suite finishes, its I$ and D$ checks start in a
+# second pool while the other simulations carry on.  The loggers are switched on with
+# -G parameters, so testbench.sv does not need to be edited.
 # This does not check the test output for correctness, run regression for that.
 # Add -p or --perf to report the hit/miss ratio. 
 # Add -d or --dist to report the distribution of loads, stores, and atomic ops.
-# These distributions may not add up to 100; this is because of flushes or invalidations.
+# Add -j N or --jobs N to limit the number of simulations running at once.
+# Add -s <file> or --summary <file> to write the results of every check as JSON.
 
 class bcolors:
     HEADER = '\033[95m'
@@ -48,36 +56,112 @@ class bcolors:
     BOLD = '\033[1m'
     UNDERLINE = '\033[4m'
 
-# tests64gc = ["coverage64gc", "arch64f", "arch64d", "arch64i", "arch64priv", "arch64c",  "arch64m", 
 tests64gc = ["coverage64gc", "arch64i", "arch64priv", "arch64c",  "arch64m",             
              "arch64zi", "wally64a", "wally64periph", "wally64priv", 
              "arch64zba",  "arch64zbb",  "arch64zbc",  "arch64zbs", 
              "imperas64f", "imperas64d", "imperas64c", "imperas64i"]
-# arch64i is the most interesting case.  Uncomment line below to run just that case
-tests64gc = ["arch64i"]
 
 cachetypes = ["ICache", "DCache"]
-simdir = os.path.expanduser("~/cvw/sim")
+WALLY = os.environ.get('WALLY')
+sys.path.append(WALLY + "/bin")
+import CacheSim
+
+simdir = WALLY + "/sim/questa"
+logroot = simdir + "/cachesim"
+
+# geometry of the rv64gc caches: 64 sets, 4 ways, 56-bit physical addresses, 44-bit tags
+numlines, numways, addrlen, taglen = 64, 4, 56, 44
+
+def runsim(test):
+    """Simulate one test suite in its own directory with the cache loggers enabled.
+    Returns the test name and the directory holding its logs."""
+    logdir = logroot + "/" + test
+    os.makedirs(logdir, exist_ok=True)
+    for cache in cachetypes:
+        try:
+            os.remove(logdir + "/" + cache + ".log")
+        except FileNotFoundError:
+            pass
+    testcmd = "cd " + logdir + "; vsim -c -do \"do " + simdir + "/wally.do rv64gc " + test + \
+              " testbench -GI_CACHE_ADDR_LOGGER=1 -GD_CACHE_ADDR_LOGGER=1\" > " + logdir + "/sim.log"
+    os.system(testcmd)
+    return test, logdir
+
+def runcachesim(test, cache, logfile):
+    """Run one cache log through the cache simulator and return its results as a dictionary."""
+    if not os.path.exists(logfile):
+        return test, cache, {'log': logfile, 'error': 'log not found'}
+    model = CacheSim.Cache(numlines, numways, addrlen, taglen)
+    trace = CacheSim.loadtrace(logfile)
+    results = CacheSim.simulate(model, trace)
+    isaccess = (trace.op == ord('R')) | (trace.op == ord('W')) | (trace.op == ord('A'))
+    mismatches = np.flatnonzero(isaccess & (results != trace.outcome))
+    hits = np.count_nonzero(isaccess & (results == ord('H')))
+    summary = {'log': logfile,
+               'accesses': int(np.count_nonzero(isaccess)),
+               'hits': int(hits),
+               'misses': int(np.count_nonzero(isaccess)) - int(hits),
+               'writebacks': int(np.count_nonzero(results == ord('D'))),
+               'loads': int(np.count_nonzero(trace.op == ord('R'))),
+               'stores': int(np.count_nonzero(trace.op == ord('W'))),
+               'atomics': int(np.count_nonzero(trace.op == ord('A'))),
+               'mismatches': int(len(mismatches)),
+               'firstmismatch': None}
+    if len(mismatches):
+        row = int(mismatches[0])
+        summary['firstmismatch'] = {'address': "%0*x" % (trace.digits, int(trace.addr[row])),
+                                    'wally': chr(trace.outcome[row]), 'sim': chr(results[row])}
+    return test, cache, summary
+
+def report(test, cache, summary, args):
+    """Print the human-readable result of one check."""
+    print(f"{bcolors.OKCYAN}%s %s:{bcolors.ENDC}" % (test, cache))
+    if 'error' in summary:
+        print(f"{bcolors.FAIL}  %s: %s{bcolors.ENDC}" % (summary['log'], summary['error']))
+        return
+    if args.dist and summary['accesses']:
+        total = summary['accesses']
+        print("  This log had", str(round(100*summary['loads']/total))+"% loads,", str(round(100*summary['stores']/total))+"% stores, and",
+              str(round(100*summary['atomics']/total))+"% atomic operations.")
+    if args.perf:
+        print("  There were", summary['hits'], "hits and", summary['misses'], "misses.")
+    if summary['mismatches']:
+        first = summary['firstmismatch']
+        print(f"{bcolors.FAIL}  %d mismatches, first at address %s. Wally: %s, Sim: %s{bcolors.ENDC}" %
+              (summary['mismatches'], first['address'], first['wally'], first['sim']))
+    else:
+        print(f"{bcolors.OKGREEN}  SUCCESS! There were no mismatches between Wally and the sim.{bcolors.ENDC}")
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Runs the cache simulator on all rv64gc test suites")
     parser.add_argument('-p', "--perf", action='store_true', help="Report hit/miss ratio")
     parser.add_argument('-d', "--dist", action='store_true', help="Report distribution of operations")
+    parser.add_argument('-j', "--jobs", type=int, default=multiprocessing.cpu_count(), help="Number of simulations to run at once")
+    parser.add_argument('-s', "--summary", help="Write a JSON summary of every check to this file")
+    parser.add_argument('tests', nargs='*', default=tests64gc, help="Test suites to run (default: all of tests64gc)")
 
     args = parser.parse_args()
 
-    testcmd = "vsim -do \"do wally-batch.do rv64gc {}\" -c > /dev/null"
-    cachecmd = "CacheSim.py 64 4 56 44 -f {}"
-    
-    if args.perf:
-        cachecmd += " -p"
-    if args.dist:
-        cachecmd += " -d"
-    
-    for test in tests64gc:
-        print(f"{bcolors.HEADER}Commencing test", test+f":{bcolors.ENDC}")
-        os.system(testcmd.format(test))
-        for cache in cachetypes:
-            print(f"{bcolors.OKCYAN}Running the", cache, f"simulator.{bcolors.ENDC}")
-            os.system(cachecmd.format(cache+".log"))
-        print()
+    summary = {test: {} for test in args.tests}
+    with multiprocessing.Pool(processes=min(len(args.tests), args.jobs)) as simpool, \
+         multiprocessing.Pool(processes=min(2*len(args.tests), multiprocessing.cpu_count())) as checkpool:
+        checks = []
+        for test, logdir in simpool.imap_unordered(runsim, args.tests):
+            print(f"{bcolors.HEADER}Finished simulating", test+f"{bcolors.ENDC}")
+            for cache in cachetypes:
+                checks.append(checkpool.apply_async(runcachesim, (test, cache, logdir + "/" + cache + ".log")))
+        for check in checks:
+            test, cache, result = check.get()
+            summary[test][cache] = result
+            report(test, cache, result, args)
+
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+    failed = [test for test in summary if any('error' in r or r['mismatches'] for r in summary[test].values())]
+    if failed:
+        print(f"{bcolors.FAIL}Mismatches or missing logs in:", " ".join(failed), f"{bcolors.ENDC}")
+    else:
+        print(f"{bcolors.OKGREEN}SUCCESS! No mismatches in any test suite.{bcolors.ENDC}")
+    sys.exit(1 if failed else 0)
@@ -242,6 +242,7 @@ module loggers import cvw::*; #(parameter cvw_t P,
       logic  PCSrcM;
       string LogFile, CFILogFile;
       logic  resetD, resetEdge;
+      int    InstrsSinceCFI; // non-CFI instructions retired since the last CFI
       flopenrc #(1) PCSrcMReg(clk, reset, dut.core.FlushM, ~dut.core.StallM, dut.core.ifu.PCSrcE, PCSrcM);
       flop #(1) ResetDReg(clk, reset, resetD);
       assign resetEdge = ~reset & resetD;
@@ -251,24 +252,32 @@ module loggers import cvw::*; #(parameter cvw_t P,
         //LogFile = $psprintf("branch_%s%0d.log", P.BPRED_TYPE, P.BPRED_SIZE);
         file = $fopen(LogFile, "w");
         CFIfile = $fopen(CFILogFile, "w");
+        InstrsSinceCFI = 0;
       end
       always @(posedge clk) begin
         if(resetEdge) begin 
           $fwrite(file, "TRAIN\n");
           $fwrite(CFIfile, "TRAIN\n");
+          InstrsSinceCFI = 0;
         end
         if(StartSample) begin
           $fwrite(file, "BEGIN %s\n", memfilename);
           $fwrite(CFIfile, "BEGIN %s\n", memfilename);
+          InstrsSinceCFI = 0;
         end
         if(dut.core.ifu.InstrClassM[0] & ~dut.core.StallW & ~dut.core.FlushW & dut.core.InstrValidM) begin
           direction = PCSrcM ? "t" : "n";
           $fwrite(file, "%h %s\n", dut.core.PCM, direction);
         end
+        // CFI lines also hold the target, the {call, return, jump, branch} class, the
+        // instruction length in bytes and the number of other instructions since the last CFI
         if((|dut.core.ifu.InstrClassM) & ~dut.core.StallW & ~dut.core.FlushW & dut.core.InstrValidM) begin
           direction = PCSrcM ? "t" : "n";
-          $fwrite(CFIfile, "%h %s\n", dut.core.PCM, direction);
-        end
+          $fwrite(CFIfile, "%h %s %h %h %0d %0d\n", dut.core.PCM, direction, dut.core.ifu.IEUAdrM, dut.core.ifu.InstrClassM,
+                  dut.core.ifu.InstrOrigM[1:0] == 2'b11 ? 4 : 2, InstrsSinceCFI);
+          InstrsSinceCFI = 0;
+        end else if(~dut.core.StallW & ~dut.core.FlushW & dut.core.InstrValidM)
+          InstrsSinceCFI = InstrsSinceCFI + 1;
         if(EndSample) begin
           $fwrite(file, "END %s\n", memfilename);
           $fwrite(CFIfile, "END %s\n", memfilename);
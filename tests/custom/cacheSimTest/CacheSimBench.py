@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+###########################################
+## CacheSimBench.py
+##
+## Purpose: Measure the throughput of the cache simulator on synthetic traces
+##
+## A component of the CORE-V-WALLY configurable RISC-V project.
+## https://github.com/openhwgroup/cvw
+##
+## Copyright (C) 2021-23 Harvey Mudd College & Oklahoma State University
+##
+## SPDX-License-Identifier: Apache-2.0 WITH SHL-2.1
+##
+## Licensed under the Solderpad Hardware License v 2.1 (the “License”); you may not use this file
+## except in compliance with the License, or, at your option, the Apache License version 2.0. You
+## may obtain a copy of the License at
+##
+## https:##solderpad.org/licenses/SHL-2.1/
+##
+## Unless required by applicable law or agreed to in writing, any work distributed under the
+## License is distributed on an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+## either express or implied. See the License for the specific language governing permissions
+## and limitations under the License.
+################################################################################################
+
+# Writes reproducible D$ logs in the DCacheLogger format with sequential, strided,
+# random and pointer-chasing access patterns, then times parsing each log and
+# simulating it with every listed geometry and replacement policy.  Each log is
+# run in a freshly spawned process so its peak RSS is its own.
+#   CacheSimBench.py                            1M accesses of each pattern
+#   CacheSimBench.py --sizes 1M 10M 100M -o bench.json
+#   CacheSimBench.py -o new.json --baseline bench.json
+# With --baseline, the accesses per second of every run are compared against an
+# earlier JSON report and the script fails if any run slowed down by more than
+# --tolerance.  Logs are kept in --tracedir and reused by later runs.
+
+import sys
+import os
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import time
+
+import numpy as np
+
+sys.path.append(os.path.expanduser("~/cvw/bin"))
+import CacheSim as cs
+
+PATTERNS = ['sequential', 'strided', 'random', 'pointerchase']
+ADDRLEN = 56
+BASE = 0x80000000
+REGION = 64 << 20 # bytes spanned by the sequential, strided and random patterns
+STRIDE = 4160 # 65 lines, so consecutive accesses land in different sets
+CHASENODES = 1 << 16 # 64-byte nodes visited by the pointer chase
+WRITEFRACTION = 0.25
+CHUNK = 1 << 20
+HEXCHARS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+
+# parses sizes such as 1M, 10M, 500k or 2500
+def parsesize(text):
+    scale = {'k': 10**3, 'M': 10**6, 'G': 10**9}.get(text[-1], 1)
+    return int(text[:-1] if scale > 1 else text) * scale
+
+# returns the addresses and ops of rows start to start+count of a pattern
+def generate(pattern, rng, order, start, count):
+    index = np.arange(start, start + count, dtype=np.uint64)
+    if pattern == 'sequential':
+        addr = BASE + (index * np.uint64(8)) % np.uint64(REGION)
+    elif pattern == 'strided':
+        addr = BASE + (index * np.uint64(STRIDE)) % np.uint64(REGION)
+    elif pattern == 'random':
+        addr = BASE + rng.integers(0, REGION // 8, count, dtype=np.uint64) * np.uint64(8)
+    else:
+        addr = BASE + order[index % np.uint64(CHASENODES)] * np.uint64(64)
+    if pattern == 'pointerchase':
+        op = np.full(count, ord('R'), dtype=np.uint8)
+    else:
+        op = np.where(rng.random(count) < WRITEFRACTION, ord('W'), ord('R')).astype(np.uint8)
+    return addr, op
+
+# writes a log of count accesses, formatted as the DCacheLogger writes them
+def writetrace(path, pattern, count, seed):
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(CHASENODES).astype(np.uint64)
+    shifts = np.arange(60, -4, -4, dtype=np.uint64)
+    with open(path + '.tmp', 'wb') as f:
+        for start in range(0, count, CHUNK):
+            addr, op = generate(pattern, rng, order, start, min(CHUNK, count - start))
+            rows = np.empty((len(addr), 21), dtype=np.uint8)
+            rows[:, :16] = HEXCHARS[(addr[:, None] >> shifts) & np.uint64(15)]
+            rows[:, 16] = rows[:, 18] = ord(' ')
+            rows[:, 17] = op
+            rows[:, 19] = ord('M')
+            rows[:, 20] = ord('\n')
+            rows.tofile(f)
+    os.rename(path + '.tmp', path)
+
+def peakrss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # KiB on Linux
+
+# parses one log and simulates it with every configuration; runs in its own process
+def benchtrace(path, configs):
+    start = time.perf_counter()
+    trace = cs.loadtrace(path)
+    parsetime = time.perf_counter() - start
+    result = {'rows': len(trace), 'parse_s': parsetime, 'parse_peak_rss_kib': peakrss(), 'runs': []}
+    for (geometry, policy) in configs:
+        (sets, ways, linebytes) = geometry
+        cache = cs.Cache(sets, ways, ADDRLEN, ADDRLEN - int(np.log2(sets*linebytes)), policy)
+        start = time.perf_counter()
+        results = cs.simulate(cache, trace)
+        simtime = time.perf_counter() - start
+        hits = int(np.count_nonzero(results == ord('H')))
+        result['runs'].append({'geometry': "%d:%d:%d" % geometry, 'policy': policy, 'simulate_s': simtime,
+                               'accesses_per_s': len(trace)/simtime, 'hits': hits, 'misses': len(trace) - hits})
+    result['peak_rss_kib'] = peakrss()
+    return result
+
+# reports runs that are more than tolerance slower than the same run in baseline
+def compare(report, baseline, tolerance):
+    old = {}
+    for entry in baseline['results']:
+        for run in entry['runs']:
+            old[(entry['pattern'], entry['accesses'], run['geometry'], run['policy'])] = run['accesses_per_s']
+    regressions = 0
+    for entry in report['results']:
+        for run in entry['runs']:
+            key = (entry['pattern'], entry['accesses'], run['geometry'], run['policy'])
+            if key not in old:
+                continue
+            ratio = run['accesses_per_s'] / old[key]
+            flag = ""
+            if ratio < 1 - tolerance:
+                flag = "  REGRESSION"
+                regressions += 1
+            print("%-13s %10d %-10s %-7s %6.2fx%s" % (key + (ratio, flag)))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures the throughput of CacheSim.py on synthetic traces.")
+    parser.add_argument("--patterns", nargs='+', choices=PATTERNS, default=PATTERNS, help="Access patterns to run")
+    parser.add_argument("--sizes", nargs='+', type=parsesize, default=[parsesize('1M')], help="Accesses per trace, e.g. 1M 10M 100M")
+    parser.add_argument("--geometries", nargs='+', type=cs.parsegeometry, default=[(64, 4, 64), (64, 1, 64), (128, 8, 64)],
+                        metavar="SETS:WAYS:LINEBYTES", help="Cache geometries to simulate (default rv64gc and two others)")
+    parser.add_argument("--policies", nargs='+', choices=list(cs.POLICIES), default=['plru', 'lru', 'srrip'], help="Replacement policies to simulate")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the generated traces")
+    parser.add_argument("--tracedir", default="/tmp/cachesimbench", help="Directory the generated logs are kept in")
+    parser.add_argument('-o', "--output", help="Write the report to this JSON file")
+    parser.add_argument("--baseline", help="Compare against an earlier JSON report")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Slowdown allowed against the baseline (default 0.2)")
+    args = parser.parse_args()
+
+    os.makedirs(args.tracedir, exist_ok=True)
+    configs = [(geometry, policy) for geometry in args.geometries for policy in args.policies]
+    report = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+              'processor': platform.processor(), 'cpus': os.cpu_count(), 'seed': args.seed, 'results': []}
+    print("%-13s %10s %8s %12s %-10s %-7s %9s %14s" % ("pattern", "accesses", "parse_s", "peakrss_kib", "geometry", "policy", "sim_s", "accesses/s"))
+    for size in args.sizes:
+        for pattern in args.patterns:
+            path = os.path.join(args.tracedir, "%s_%d_%d.log" % (pattern, size, args.seed))
+            if not os.path.exists(path):
+                writetrace(path, pattern, size, args.seed)
+            with multiprocessing.get_context('spawn').Pool(1) as pool:
+                result = pool.apply(benchtrace, (path, configs))
+            report['results'].append(dict(pattern=pattern, accesses=size, **result))
+            for run in result['runs']:
+                print("%-13s %10d %8.2f %12d %-10s %-7s %9.2f %14.0f" % (pattern, size, result['parse_s'], result['peak_rss_kib'],
+                      run['geometry'], run['policy'], run['simulate_s'], run['accesses_per_s']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance):
+            sys.exit(1)
@@ -30,6 +30,8 @@
 
 import sys
 import os
+import collections
+import tempfile
 
 sys.path.append(os.path.expanduser("~/cvw/bin"))
 import CacheSim as cs
@@ -45,46 +47,96 @@ if __name__ == "__main__":
     
     #insert way 0 set C tag AB
     assert (cache.cacheaccess(0xABCD) == 'M')
-    assert (cache.ways[0][0xC].tag == 0xAB)
+    assert (cache.getline(0, 0xC).tag == 0xAB)
     assert (cache.cacheaccess(0xABCD) == 'H')
-    assert (cache.pLRU[0xC] == [1,1,0])
+    assert (cache.getpLRU(0xC) == [1,1,0])
 
     #make way 0 set C dirty
     assert (cache.cacheaccess(0xABCD, True) == 'H')
 
     #insert way 1 set C tag AC 
     assert (cache.cacheaccess(0xACCD) == 'M')
-    assert (cache.ways[1][0xC].tag == 0xAC)
-    assert (cache.pLRU[0xC] == [1,0,0])
+    assert (cache.getline(1, 0xC).tag == 0xAC)
+    assert (cache.getpLRU(0xC) == [1,0,0])
 
     #insert way 2 set C tag AD
     assert (cache.cacheaccess(0xADCD) == 'M')
-    assert (cache.ways[2][0xC].tag == 0xAD)
-    assert (cache.pLRU[0xC] == [0,0,1])
+    assert (cache.getline(2, 0xC).tag == 0xAD)
+    assert (cache.getpLRU(0xC) == [0,0,1])
 
     #insert way 3 set C tag AE 
     assert (cache.cacheaccess(0xAECD) == 'M')
-    assert (cache.ways[3][0xC].tag == 0xAE)
-    assert (cache.pLRU[0xC] == [0,0,0])
+    assert (cache.getline(3, 0xC).tag == 0xAE)
+    assert (cache.getpLRU(0xC) == [0,0,0])
 
     #misc hit and pLRU checking
     assert (cache.cacheaccess(0xABCD) == 'H')
-    assert (cache.pLRU[0xC] == [1,1,0])
+    assert (cache.getpLRU(0xC) == [1,1,0])
     assert (cache.cacheaccess(0xADCD) == 'H')
-    assert (cache.pLRU[0xC] == [0,1,1])
+    assert (cache.getpLRU(0xC) == [0,1,1])
 
     #evict way 1, now set C has tag AF
     assert (cache.cacheaccess(0xAFCD) == 'E')
-    assert (cache.ways[1][0xC].tag == 0xAF)
-    assert (cache.pLRU[0xC] == [1,0,1])
+    assert (cache.getline(1, 0xC).tag == 0xAF)
+    assert (cache.getpLRU(0xC) == [1,0,1])
 
     #evict way 3, now set C has tag AC
     assert (cache.cacheaccess(0xACCD) == 'E')
-    assert (cache.ways[3][0xC].tag == 0xAC)
-    assert (cache.pLRU[0xC] == [0,0,0])
+    assert (cache.getline(3, 0xC).tag == 0xAC)
+    assert (cache.getpLRU(0xC) == [0,0,0])
 
     #evict way 0, now set C has tag EA
     #this line was dirty, so there was a wb
     assert (cache.cacheaccess(0xEAC2) == 'D')
-    assert (cache.ways[0][0xC].tag == 0xEA)
-    assert (cache.pLRU[0xC] == [1,1,0])
\ No newline at end of file
+    assert (cache.getline(0, 0xC).tag == 0xEA)
+    assert (cache.getpLRU(0xC) == [1,1,0])
+
+    #stack-distance sweep: one stack gives 1, 2 and 4 way LRU at once
+    stack = cs.LRUStack(16, [1, 2, 4], 16, 4)
+    assert (stack.setaccess(0xAB, 0xC) == ['M','M','M'])
+    assert (stack.setaccess(0xAC, 0xC, True) == ['E','M','M'])
+    assert (stack.setaccess(0xAB, 0xC) == ['D','H','H'])
+    assert (stack.setaccess(0xAD, 0xC) == ['E','D','M'])
+    assert (stack.setaccess(0xAC, 0xC) == ['E','E','H'])
+
+    #3C classification: 0x1200 and 0x2200 share set 2 of a direct mapped cache
+    direct = cs.Cache(16, 1, 16, 8)
+    trace = cs.CacheTrace(cs.np.array([0x1200, 0x2200, 0x1200, 0x1200], dtype=cs.np.uint64),
+                          cs.np.frombuffer(b'RRRR', dtype=cs.np.uint8), None, {})
+    results = cs.simulate(direct, trace)
+    assert (bytes(results) == b'MEEH')
+    [(name, counts)] = cs.classifymisses(direct, trace, results)
+    assert ((counts['Compulsory'], counts['Capacity'], counts['Conflict']) == (2, 0, 1))
+
+    #snapshot at the end of a log whose length is a multiple of the line index stride
+    with tempfile.TemporaryDirectory() as tmp:
+        logpath = os.path.join(tmp, 'dcache.log')
+        rows = 2*cs.TRACEINDEXSTRIDE
+        with open(logpath, 'w') as f:
+            for i in range(rows):
+                f.write("%016x R M\n" % (0x80000000 + 64*(i % 300)))
+        snappath = os.path.join(tmp, 'end.snap')
+        trace = cs.loadtrace(logpath)
+        counts = collections.Counter()
+        cs.simulatesnapshots(cs.Cache(16, 4, 56, 46), trace, [(rows, snappath)], logpath, counts)
+        state = cs.loadsnapshot(snappath)
+        assert (state['row'] == rows and state['counts']['Accesses'] == rows)
+        assert (len(cs.resumetrace(state, logpath)) == 0)
+
+    #binary traces round-trip a text log and refuse ops they cannot encode
+    with tempfile.TemporaryDirectory() as tmp:
+        logpath = os.path.join(tmp, 'dcache.log')
+        with open(logpath, 'w') as f:
+            f.write("TRAIN\n0000000080000000 R M\n0000000080000040 W H\nF\n0000000080000000 A E\nEND\n")
+        trace = cs.loadtrace(logpath)
+        cs.savetrace(trace, os.path.join(tmp, 'dcache.bin'))
+        mapped = cs.loadtrace(os.path.join(tmp, 'dcache.bin'))
+        assert (bytes(mapped.op) == bytes(trace.op) == b'TRWFAE')
+        assert (bytes(mapped.outcome) == bytes(trace.outcome) and mapped.labels == trace.labels)
+        with open(logpath, 'a') as f:
+            f.write("0000000080000080 Z M\n")
+        try:
+            cs.savetrace(cs.loadtrace(logpath), os.path.join(tmp, 'bad.bin'))
+            assert False, "unknown op was written"
+        except ValueError as error:
+            assert ("row 6" in str(error) and "'Z'" in str(error))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+###########################################
+## TLBSimTest.py
+##
+## Purpose: Check that TLBSim follows the privilege mode through repeated traps and
+##          that skipping repeated lookups of a page does not change any miss count
+##
+## A component of the CORE-V-WALLY configurable RISC-V project.
+## https://github.com/openhwgroup/cvw
+##
+## Copyright (C) 2021-23 Harvey Mudd College & Oklahoma State University
+##
+## SPDX-License-Identifier: Apache-2.0 WITH SHL-2.1
+##
+## Licensed under the Solderpad Hardware License v 2.1 (the “License”); you may not use this file 
+## except in compliance with the License, or, at your option, the Apache License version 2.0. You 
+## may obtain a copy of the License at
+##
+## https:##solderpad.org/licenses/SHL-2.1/
+##
+################################################################################################
+
+import sys
+import os
+import random
+import tempfile
+
+sys.path.append(os.path.expanduser("~/cvw/bin"))
+import TLBSim as ts
+
+# M mode sets mtvec and an Sv39 satp, then mrets to U code that loads and
+# takes the same ecall twice.  The second trap has the same mepc and mcause,
+# so the tracer logs no CSR writes for it; its handler must still run in M
+# mode, where nothing is translated.
+TRACE = """\
+80000000,00000013,csr[305] = 80001000 csr[180] = 8000000000080000
+80000004,30200073,
+00010000,00000013,rf[10] = 20000
+00010004,00053283,rf[05] = 0
+00010008,00000073,
+80001000,00053283,rf[05] = 0 csr[341] = 10008 csr[342] = 8
+80001004,30200073,
+00010008,00000073,
+80001000,00053283,rf[05] = 0
+80001004,30200073,
+0001000c,00053283,rf[05] = 0
+"""
+
+# U code spread over a few pages, each instruction a load whose rf write
+# sets the address of the next load, with runs of repeated pages
+def randomtrace(seed, length=4000):
+    rng = random.Random(seed)
+    lines = ["80000000,00000013,csr[180] = 8000000000080000 rf[10] = 20000",
+             "80000004,30200073,"]
+    (ipage, dpage) = (0, 0)
+    for i in range(length):
+        if rng.random() < 0.3:
+            ipage = rng.randrange(6)
+        if rng.random() < 0.4:
+            dpage = rng.randrange(6)
+        lines.append("%08x,00053283,rf[10] = %x" % (0x10000 + (ipage << 12) + 4*(i % 1024), 0x40000 + (dpage << 12) + 8*(i % 512)))
+    return "\n".join(lines) + "\n"
+
+def runtrace(text, policy, shortcut):
+    with tempfile.NamedTemporaryFile('w', suffix='.log') as f:
+        f.write(text)
+        f.flush()
+        itlbs = [ts.TLB("ITLB", 4, 4, policy), ts.TLB("ITLB", 4, 2, policy)]
+        dtlbs = [ts.TLB("DTLB", 4, 4, policy), ts.TLB("DTLB", 4, 2, policy)]
+        ts.simulate(f.name, itlbs, dtlbs, shortcut=shortcut)
+    return [(tlb.accesses, tlb.misses, tlb.walkreads) for tlb in itlbs + dtlbs]
+
+# a TLB that skips a lookup of the page it just looked up, as simulate does
+def shortcutmisses(policy, keys):
+    tlb = ts.TLB("TLB", 4, 4, policy)
+    last = None
+    for key in keys:
+        if key != last:
+            tlb.access(key, None, 3)
+            last = key
+    return tlb.misses
+
+def fullmisses(policy, keys):
+    tlb = ts.TLB("TLB", 4, 4, policy)
+    for key in keys:
+        tlb.access(key, None, 3)
+    return tlb.misses
+
+if __name__ == "__main__":
+    with tempfile.NamedTemporaryFile('w', suffix='.log') as f:
+        f.write(TRACE)
+        f.flush()
+        itlbs = [ts.TLB("ITLB", 2, 2)]
+        dtlbs = [ts.TLB("DTLB", 2, 2)]
+        counts = ts.simulate(f.name, itlbs, dtlbs)
+
+    # only the U instructions are fetched and loaded through the TLBs
+    assert (counts['Instructions'] == 11)
+    assert (counts['Fetches'] == 5)
+    assert (counts['DataAccesses'] == 2)
+    assert (itlbs[0].accesses == 5 and itlbs[0].misses == 1)
+    assert (dtlbs[0].accesses == 2 and dtlbs[0].misses == 1)
+
+    # the shortcut gives the same counts as looking up every access, for every policy
+    for policy in ts.TLBPOLICIES:
+        for seed in range(3):
+            text = randomtrace(seed)
+            assert (runtrace(text, policy, True) == runtrace(text, policy, False)), policy
+
+    # and it is only taken for policies where skipping a repeat cannot matter
+    rng = random.Random(1)
+    for policy in ts.REPEATSAFEPOLICIES:
+        for trial in range(500):
+            keys = [rng.randrange(6) for i in range(rng.randrange(4, 40))]
+            keys = [key for key in keys for repeat in range(rng.randrange(1, 3))]
+            assert (shortcutmisses(policy, keys) == fullmisses(policy, keys)), policy